@@ -1,66 +1,233 @@
+import time
+T_START = time.monotonic()  # cold-start reference, before any heavy import
 from flask import Flask, render_template, request, jsonify, Response
+import os
 import json
+import math
 import navio.led as navio_led
-import navio.barometer as navio_baro
-import navio.imu as navio_imu
-import time
+import navio.broadcast as navio_broadcast
+import navio.calibration as navio_calibration
+import navio.startup as navio_startup
+import navio.scheduler as navio_scheduler
+import navio.metrics as navio_metrics
+import navio.bus as navio_bus
+
+# The sensor stack (NumPy, drivers, filters) is imported by the startup tasks in the background
+STREAM_READY_TIMEOUT = 10.0
+IMU_BIN_MAX_ROWS = 512  # samples in one binary IMU frame, ~1 s at the 500 Hz FIFO rate
+BARO_BIN_MAX_ROWS = 128  # samples in one binary barometer frame, ~1.5 s at ~85 Hz
 
 app = Flask(__name__)
+app.acquisition = None
+
+def start_baro():
+    import navio.barometer as navio_baro
+    import navio.telemetry as navio_telemetry
+    if app.acquisition:
+        import navio.acquisition as navio_acquisition
+        app.baro = navio_acquisition.SensorReader("baro", app.acquisition)
+    else:
+        app.baro = navio_baro.BarometerManager(cache=app.calibration)
+        app.baro.start()
+    app.baro_events = navio_broadcast.Broadcaster(encode_baro, app.baro.wait_update, min_period=0.1,
+                                                    name="baro")
+    app.baro_events.start()
+    app.baro_bin = navio_telemetry.BinaryEncoder(("Ps", "OAT"), (1, 2))
+    app.baro_bin_t = time.time()
+    app.baro_bin_events = navio_broadcast.Broadcaster(encode_baro_bin, app.baro.wait_update, min_period=0.1,
+                                                        name="baro-bin")
+    app.baro_bin_events.start()
+
+def start_imu():
+    import navio.imu as navio_imu
+    import navio.telemetry as navio_telemetry
+    # NAVIO_IMU_INT_PIN=<GPIO wired to the MPU9250 INT output>: read at every data ready interrupt
+    # instead of draining the FIFO
+    interrupt_pin = os.environ.get("NAVIO_IMU_INT_PIN")
+    if app.acquisition:
+        import navio.acquisition as navio_acquisition
+        app.imu = navio_acquisition.SensorReader("imu", app.acquisition)
+    else:
+        if interrupt_pin:
+            app.imu = navio_imu.IMUManager(cache=app.calibration, interrupt_pin=int(interrupt_pin))
+        else:
+            app.imu = navio_imu.IMUManager(fifo=True, cache=app.calibration)
+        app.imu.start()
+    app.imu_events = navio_broadcast.Broadcaster(encode_imu, app.imu.wait_update, min_period=0.1,
+                                                   name="imu")
+    app.imu_events.start()
+    imu_signals = ("ax", "ay", "az", "gx", "gy", "gz", "mx", "my", "mz", "roll", "pitch", "yaw")
+    app.imu_bin = navio_telemetry.BinaryEncoder(imu_signals, [app.imu.FIELDS.index(s) for s in imu_signals])
+    app.imu_bin_t = time.time()
+    app.imu_bin_events = navio_broadcast.Broadcaster(encode_imu_bin, app.imu.wait_update, min_period=0.1,
+                                                       name="imu-bin")
+    app.imu_bin_events.start()
+
+def not_ready(*sensors, timeout=0.0):
+    # 503 response for the first sensor that is not initialized (yet), None when all are ready
+    for name in sensors:
+        if not app.startup.wait(name, timeout):
+            return jsonify({"error": f"{name} not ready", "status": app.startup.status()["sensors"][name]}), 503
+    return None
 
-def generate_events_baro():
-    while True:
-        data = {
-            "time": time.time(),
-            "OAT": app.baro.baro.get_temperature(),
-            "Ps": app.baro.baro.get_pressure()
-        }
-        yield f"data: {json.dumps(data)}\n\n"
-        time.sleep(0.5)
+@app.route('/metrics')
+def metrics():
+    return Response(navio_metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/status')
+def status():
+    return jsonify(dict(app.startup.status(), scheduler=navio_scheduler.get_scheduler().stats(),
+                        i2c=navio_bus.get_i2c_arbiter(1).stats() if not app.acquisition else None,
+                        imu=app.imu.stats() if app.startup.is_ready("imu") else None))
+
+def encode_baro():
+    sample = app.baro.latest()
+    if sample is None:
+        return None
+    data = {
+        "time": time.time(),
+        "OAT": sample[2],
+        "Ps": sample[1]
+    }
+    return f"data: {json.dumps(data)}\n\n".encode()
 
 @app.route('/events-baro')
 def events_baro():
-    return Response(generate_events_baro(), mimetype="text/event-stream")
-
-def generate_events_imu():
-    while True:
-        raw_data = app.imu.get_data()
-        data = {
-            "time": time.time(),
-            "ax": raw_data[0][0],
-            "ay": raw_data[0][1],
-            "az": raw_data[0][2],
-            "gx": raw_data[1][0],
-            "gy": raw_data[1][1],
-            "gz": raw_data[1][2],
-            "mx": raw_data[2][0],
-            "my": raw_data[2][1],
-            "mz": raw_data[2][2],
-            "roll": raw_data[3][0],
-            "pitch": raw_data[3][1],
-            "yaw": raw_data[3][2]
-        }
-        yield f"data: {json.dumps(data)}\n\n"
-        time.sleep(0.1)
+    error = not_ready("baro", timeout=STREAM_READY_TIMEOUT)
+    if error:
+        return error
+    return Response(app.baro_events.stream(), mimetype="text/event-stream")
+
+def encode_imu():
+    sample = app.imu.latest()
+    if sample is None:
+        sample = [time.time()] + [0.0] * (len(app.imu.FIELDS) - 1)
+    data = {
+        "time": sample[0],
+        "ax": sample[1],
+        "ay": sample[2],
+        "az": sample[3],
+        "gx": sample[4],
+        "gy": sample[5],
+        "gz": sample[6],
+        "mx": sample[7],
+        "my": sample[8],
+        "mz": sample[9],
+        "roll": sample[14],
+        "pitch": sample[15],
+        "yaw": sample[16]
+    }
+    return f"data: {json.dumps(data)}\n\n".encode()
 
 @app.route('/events-imu')
 def events_imu():
-    return Response(generate_events_imu(), mimetype="text/event-stream")
+    error = not_ready("imu", timeout=STREAM_READY_TIMEOUT)
+    if error:
+        return error
+    return Response(app.imu_events.stream(), mimetype="text/event-stream")
+
+def new_samples(manager, t, max_rows):
+    # Copy of the samples newer than t among the last max_rows. The broadcasters do not encode
+    # without subscribers, so the first frame after an idle period is capped to max_rows samples.
+    import numpy as np
+    block = manager.window(max_rows, copy=True)
+    return block[np.searchsorted(block[:, 0], t, side='right'):]
+
+def encode_baro_bin():
+    # Every sample since the previous message, batched in one frame
+    block = new_samples(app.baro, app.baro_bin_t, BARO_BIN_MAX_ROWS)
+    if len(block) == 0:
+        return None
+    app.baro_bin_t = block[-1, 0]
+    return app.baro_bin.encode(block)
+
+@app.route('/events-baro-bin')
+def events_baro_bin():
+    error = not_ready("baro", timeout=STREAM_READY_TIMEOUT)
+    if error:
+        return error
+    return Response(app.baro_bin_events.stream(app.baro_bin.schema()), mimetype="text/event-stream")
+
+def encode_imu_bin():
+    # Every sample since the previous message, batched in one frame
+    block = new_samples(app.imu, app.imu_bin_t, IMU_BIN_MAX_ROWS)
+    if len(block) == 0:
+        return None
+    app.imu_bin_t = block[-1, 0]
+    return app.imu_bin.encode(block)
+
+@app.route('/events-imu-bin')
+def events_imu_bin():
+    error = not_ready("imu", timeout=STREAM_READY_TIMEOUT)
+    if error:
+        return error
+    return Response(app.imu_bin_events.stream(app.imu_bin.schema()), mimetype="text/event-stream")
+
+@app.route('/history')
+def history():
+    signal = request.args.get('signal', '')
+    try:
+        t_to = float(request.args.get('to', time.time()))
+        t_from = float(request.args.get('from', t_to - 3600))
+        points = int(request.args.get('points', 500))
+    except ValueError:
+        return jsonify({"error": "from, to and points must be numbers"}), 400
+    if not (math.isfinite(t_from) and math.isfinite(t_to)) or t_from > t_to:
+        return jsonify({"error": "from and to must be finite with from <= to"}), 400
+    for manager in [getattr(app, name) for name in ("imu", "baro") if app.startup.is_ready(name)]:
+        if signal in manager.history.index:
+            return jsonify(manager.history.query(signal, t_from, t_to, max(points, 1)))
+    return jsonify({"error": f"Unknown signal: {signal}"}), 404
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def led_unavailable(error):
+    # The LED manager of the acquisition process did not answer (not running, or timed out)
+    return jsonify({"error": f"LED manager unavailable: {error}"}), 503
+
 @app.route('/runled', methods=['POST'])
 def runled():
     if request.is_json:
-        if not app.runled:
-            app.led.start()
-            app.runled = True
-            return jsonify({"message": "LED Start"})
+        try:
+            if not app.runled:
+                app.led.start()
+                app.runled = True
+                return jsonify({"message": "LED Start"})
+            else:
+                app.led.shutdown()
+                app.runled = False
+                return jsonify({"message": "LED Stop"})
+        except OSError as e:
+            return led_unavailable(e)
+    else:
+        return jsonify({"error": "Request body must be JSON"}), 400
+
+@app.route('/runrec', methods=['POST'])
+def runrec():
+    if request.is_json:
+        error = not_ready("imu", "baro")
+        if error:
+            return error
+        if app.acquisition:
+            return jsonify({"error": "Recording is not supported in acquisition mode"}), 409
+        import navio.recorder as navio_recorder
+        if not app.imu.recorder:
+            imu_recorder = navio_recorder.Recorder(app.record_dir, "imu", navio_recorder.IMU_DTYPE)
+            baro_recorder = navio_recorder.Recorder(app.record_dir, "baro", navio_recorder.BARO_DTYPE)
+            imu_recorder.start()
+            baro_recorder.start()
+            app.imu.recorder = imu_recorder
+            app.baro.recorder = baro_recorder
+            return jsonify({"message": "Recording Start"})
         else:
-            app.led.shutdown()
-            app.runled = False
-            return jsonify({"message": "LED Stop"})
+            imu_recorder, baro_recorder = app.imu.recorder, app.baro.recorder
+            app.imu.recorder = None
+            app.baro.recorder = None
+            imu_recorder.shutdown()
+            baro_recorder.shutdown()
+            return jsonify({"message": "Recording Stop"})
     else:
         return jsonify({"error": "Request body must be JSON"}), 400
 
@@ -68,20 +235,69 @@ def runled():
 def confled():
     if request.is_json:
         received_data = request.get_json()
-        app.led.write_conf(received_data.get('mode'),
-                           (received_data.get('red'), received_data.get('green'), received_data.get('blue'))
-                           )
+        if not isinstance(received_data, dict):
+            return jsonify({"error": "Request body must be a JSON object"}), 400
+        try:
+            app.led.configure(received_data.get('mode'),
+                              (received_data.get('red'), received_data.get('green'), received_data.get('blue'))
+                              )
+            status = app.led.get_status()
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid LED configuration: {e}"}), 400
+        except OSError as e:
+            return led_unavailable(e)
         return jsonify({
-            "message": "Conf updated"
+            "message": "Conf updated",
+            "status": status
         })
     else:
         return jsonify({"error": "Request body must be JSON"}), 400
 
-if __name__ == '__main__':
-    app.led = navio_led.NavioLEDManager()
+@app.route('/confled', methods=['GET'])
+def ledstatus():
+    try:
+        return jsonify(app.led.get_status())
+    except OSError as e:
+        return led_unavailable(e)
+
+@app.route('/confimu', methods=['POST'])
+def confimu():
+    if request.is_json:
+        error = not_ready("imu")
+        if error:
+            return error
+        if app.acquisition:
+            return jsonify({"error": "The IMU filter runs in the acquisition process"}), 409
+        received_data = request.get_json()
+        if not isinstance(received_data, dict):
+            return jsonify({"error": "Request body must be a JSON object"}), 400
+        try:
+            gains = {name: float(received_data[name]) for name in ('k_P', 'k_I', 'gain') if name in received_data}
+            app.imu.set_filter(received_data.get('filter'), **gains)
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid IMU filter configuration: {e}"}), 400
+        return jsonify({
+            "message": "IMU filter updated"
+        })
+    else:
+        return jsonify({"error": "Request body must be JSON"}), 400
+
+def setup():
+    # NAVIO_ACQUISITION=<prefix>: the sensors and the LED are owned by a separate
+    # `python -m navio.acquisition --prefix <prefix>` process, read here from shared memory
+    app.acquisition = os.environ.get("NAVIO_ACQUISITION")
+    app.calibration = navio_calibration.CalibrationCache()
+    app.led = navio_led.NavioLEDClient() if app.acquisition else navio_led.NavioLEDManager()
     app.runled = False
-    app.baro = navio_baro.BarometerManager()
-    app.baro.start()
-    app.imu = navio_imu.IMUManager()
-    app.imu.start()
+    app.record_dir = "recordings"
+    # Sensors are initialized concurrently in the background, the server is up immediately
+    app.startup = navio_startup.StartupManager(T_START)
+    app.startup.add("baro", start_baro)
+    app.startup.add("imu", start_imu)
+    app.startup.start()
+
+if __name__ == '__main__':
+    # Threaded development server, see asgi.py for the async serving mode
+    setup()
+    app.startup.server_started()
     app.run(debug=True, host='0.0.0.0', use_reloader=False)
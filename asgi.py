@@ -0,0 +1,159 @@
+# Async serving mode: `python asgi.py [--host H] [--port P]` runs the same routes and templates as
+# app.py under uvicorn (or use `asgi:application` with any ASGI server). The SSE routes are served
+# natively from the event loop with Broadcaster.astream(), so an idle subscriber costs a coroutine
+# instead of a thread; every other request goes to the Flask app in a worker thread.
+import io
+import sys
+import asyncio
+import argparse
+from app import app, setup, STREAM_READY_TIMEOUT
+
+# path: (sensor, broadcaster attribute, preamble)
+STREAMS = {
+    "/events-imu": ("imu", "imu_events", None),
+    "/events-baro": ("baro", "baro_events", None),
+    "/events-imu-bin": ("imu", "imu_bin_events", lambda: app.imu_bin.schema()),
+    "/events-baro-bin": ("baro", "baro_bin_events", lambda: app.baro_bin.schema()),
+}
+
+
+def wsgi_environ(scope, body):
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "SERVER_NAME": (scope.get("server") or ("localhost", 80))[0],
+        "SERVER_PORT": str((scope.get("server") or ("localhost", 80))[1]),
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def call_wsgi(environ):
+    # Whole response of a (non-streaming) Flask request
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["status"] = int(status.split(" ", 1)[0])
+        response["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+    result = app.wsgi_app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return response["status"], response["headers"], body
+
+
+async def handle_wsgi(scope, receive, send):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    status, headers, body = await asyncio.get_running_loop().run_in_executor(
+        None, call_wsgi, wsgi_environ(scope, body))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def handle_stream(scope, receive, send, sensor, broadcaster, preamble):
+    loop = asyncio.get_running_loop()
+    if not await loop.run_in_executor(None, app.startup.wait, sensor, STREAM_READY_TIMEOUT):
+        return await handle_wsgi(scope, receive, send)  # the Flask route answers the 503
+    events = getattr(app, broadcaster)
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")]})
+
+    async def pump():
+        async for chunk in events.astream(preamble() if preamble else None):
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+    async def disconnected():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    # Runs until the client disconnects or the broadcaster shuts down
+    tasks = {asyncio.ensure_future(pump()), asyncio.ensure_future(disconnected())}
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    await send({"type": "http.response.body", "body": b""})
+
+
+def shutdown():
+    for name in ("imu_events", "imu_bin_events", "baro_events", "baro_bin_events"):
+        events = getattr(app, name, None)
+        if events:
+            events.shutdown()
+    for name in ("imu", "baro"):
+        manager = getattr(app, name, None)
+        if manager:
+            manager.shutdown()
+    led = getattr(app, "led", None)
+    if led and app.acquisition:
+        led.close()  # the LED belongs to the acquisition process, left as it is
+    elif led:
+        led.shutdown()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            setup()
+            app.startup.server_started()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await asyncio.get_running_loop().run_in_executor(None, shutdown)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    stream = STREAMS.get(scope["path"]) if scope["method"] == "GET" else None
+    if stream:
+        return await handle_stream(scope, receive, send, *stream)
+    return await handle_wsgi(scope, receive, send)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Navio web server, async serving mode")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    import uvicorn
+    uvicorn.run(application, host=args.host, port=args.port, lifespan="on", log_level="warning")
+
+
+if __name__ == '__main__':
+    main()
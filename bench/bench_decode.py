@@ -0,0 +1,85 @@
+# Micro-benchmark: legacy per-axis struct.unpack decoding vs MPU9250Decoder
+# usage: python -m bench.bench_decode [iterations]
+import sys
+import random
+import timeit
+from navio.mpu9250 import MPU9250, MPU9250Decoder
+
+G_SI = MPU9250.G_SI
+PI = MPU9250.PI
+ACC_DIVIDER = 2048.0
+GYRO_DIVIDER = 16.4
+ASA = [0.15, 0.15, 0.15]
+SAMPLE_SIZE = 22  # read_all() burst: accel, temp, gyro, then ST1, HXL..HZH, ST2
+MAG_OFFSET = 15
+
+
+def legacy_read_all(mpu, response, acc, gyro, mag):
+    # Decoding loop of read_all() before MPU9250Decoder, on the current burst layout
+    for i in range(0, 3):
+        data = mpu.byte_to_float(response[i*2:i*2+2])
+        acc[i] = G_SI * data / ACC_DIVIDER
+    temp = mpu.byte_to_float(response[6:8])
+    temperature = (temp/340.0)+36.53
+    for i in range(4, 7):
+        data = mpu.byte_to_float(response[i*2:i*2+2])
+        gyro[i-4] = (PI/180) * data / GYRO_DIVIDER
+    for i in range(0, 3):
+        data = mpu.byte_to_float_le(response[MAG_OFFSET+i*2:MAG_OFFSET+i*2+2])
+        mag[i] = data * ASA[i]
+    return temperature
+
+
+def legacy_read_fifo(mpu, response, frames):
+    acc = []
+    gyro = []
+    temp = []
+    for n in range(0, frames):
+        frame = response[n*14:(n+1)*14]
+        acc.append([G_SI * mpu.byte_to_float(frame[i*2:i*2+2]) / ACC_DIVIDER for i in range(0, 3)])
+        temp.append((mpu.byte_to_float(frame[6:8])/340.0)+36.53)
+        gyro.append([(PI/180) * mpu.byte_to_float(frame[i*2:i*2+2]) / GYRO_DIVIDER for i in range(4, 7)])
+    return acc, gyro, temp
+
+
+def run(iterations=20000):
+    mpu = MPU9250.__new__(MPU9250)  # decoding only, no SPI bus needed
+    decoder = MPU9250Decoder()
+    decoder.set_scales(G_SI / ACC_DIVIDER, (PI/180) / GYRO_DIVIDER, ASA)
+    sample = [random.randrange(256) for _ in range(SAMPLE_SIZE)]
+    fifo = [random.randrange(256) for _ in range(36 * 14)]
+    acc = [0.0, 0.0, 0.0]
+    gyro = [0.0, 0.0, 0.0]
+    mag = [0.0, 0.0, 0.0]
+
+    # Both paths must agree before timing them
+    t_legacy = legacy_read_all(mpu, sample, acc, gyro, mag)
+    ref = acc + gyro + mag
+    t_new = decoder.decode_all(sample, acc, gyro, mag, MAG_OFFSET)
+    assert all(abs(a - b) < 1e-9 for a, b in zip(ref, acc + gyro + mag)) and abs(t_legacy - t_new) < 1e-9
+    fifo_acc, fifo_gyro, fifo_temp = legacy_read_fifo(mpu, fifo, 36)
+    block = decoder.decode_fifo(fifo, 36)
+    assert abs(block[:, 0:3] - fifo_acc).max() < 1e-9 and abs(block[:, 4:7] - fifo_gyro).max() < 1e-9
+    assert abs(block[:, 3] - fifo_temp).max() < 1e-9
+
+    fifo_iterations = max(iterations // 36, 1)
+    per_sample = 1e6 / iterations
+    per_frame = 1e6 / (fifo_iterations * 36)
+    results = {
+        "read_all legacy": per_sample * timeit.timeit(lambda: legacy_read_all(mpu, sample, acc, gyro, mag),
+                                                      number=iterations),
+        "read_all decoder": per_sample * timeit.timeit(
+            lambda: decoder.decode_all(sample, acc, gyro, mag, MAG_OFFSET), number=iterations),
+        "fifo x36 legacy": per_frame * timeit.timeit(lambda: legacy_read_fifo(mpu, fifo, 36),
+                                                     number=fifo_iterations),
+        "fifo x36 decoder": per_frame * timeit.timeit(lambda: decoder.decode_fifo(fifo, 36),
+                                                      number=fifo_iterations),
+    }
+
+    for name, us in results.items():
+        print(f"{name:20s} {us:8.2f} us/sample")
+    return results
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
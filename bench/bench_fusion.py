@@ -0,0 +1,53 @@
+# Compares the per-sample cost of AttitudeFilter and the ahrs package, tests/test_fusion.py checks they agree
+# usage: python -m bench.bench_fusion [samples]
+import sys
+import time
+import numpy as np
+from ahrs.filters import Mahony, Madgwick
+from ahrs.common.orientation import q2rpy
+from navio.fusion import AttitudeFilter
+
+FREQUENCY = 500.0
+
+
+def synthetic_motion(samples):
+    # Slow rotation on all axes with noisy gravity and a tilted magnetic field
+    rng = np.random.default_rng(0)
+    t = np.arange(samples) / FREQUENCY
+    gyr = np.column_stack([0.3*np.sin(t), 0.2*np.cos(0.7*t), 0.1*np.ones(samples)]) + rng.normal(0, 0.01, (samples, 3))
+    acc = np.array([0.0, 0.0, 9.81]) + rng.normal(0, 0.2, (samples, 3))
+    mag = np.array([20.0, 2.0, -40.0]) + rng.normal(0, 1.0, (samples, 3))
+    return gyr, acc, mag
+
+
+def run(samples=5000):
+    gyr, acc, mag = synthetic_motion(samples)
+    references = {
+        AttitudeFilter.MAHONY: Mahony(frequency=FREQUENCY),
+        AttitudeFilter.MADGWICK: Madgwick(frequency=FREQUENCY, gain=0.041),
+    }
+    results = {}
+    for algorithm, reference in references.items():
+        q = np.array([1.0, 0.0, 0.0, 0.0])
+        rpy_ref = np.zeros((samples, 3))
+        start = time.perf_counter()
+        for i in range(samples):
+            q = reference.updateMARG(q, gyr[i], acc[i], mag[i])
+            rpy_ref[i] = q2rpy(q, in_deg=True)
+        t_ref = time.perf_counter() - start
+
+        engine = AttitudeFilter(algorithm, frequency=FREQUENCY, gain=0.041)
+        start = time.perf_counter()
+        _, rpy = engine.update_block(gyr, acc, mag)
+        t_engine = time.perf_counter() - start
+
+        error = np.abs(rpy - rpy_ref).max()
+        results[algorithm] = {"ahrs_us": 1e6 * t_ref / samples, "engine_us": 1e6 * t_engine / samples,
+                              "max_error_deg": float(error)}
+        print(f"{algorithm:10s} ahrs {results[algorithm]['ahrs_us']:8.2f} us/sample  "
+              f"engine {results[algorithm]['engine_us']:8.2f} us/sample  max error {error:.2e} deg")
+    return results
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
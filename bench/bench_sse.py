@@ -0,0 +1,120 @@
+# SSE load test: starts the web server on the simulated board, opens idle /events-imu subscribers
+# (they read whatever the server sends, nothing else) and reports the server's resident memory,
+# CPU use and thread count per connection, for the async (asgi.py) or threaded (app.py) server.
+# usage: python -m bench.bench_sse [--server asgi|wsgi] [--clients 50,200] [--duration 5]
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import selectors
+import tempfile
+import threading
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 5000
+SERVERS = {"asgi": ["asgi.py", "--port", str(PORT)], "wsgi": ["app.py"]}
+
+
+def process_stats(pid):
+    # (resident memory in bytes, user + system CPU seconds, threads)
+    with open(f"/proc/{pid}/status") as f:
+        status = dict(line.split(":", 1) for line in f if ":" in line)
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    return int(status["VmRSS"].split()[0]) * 1024, cpu, int(status["Threads"])
+
+
+def measure(pid, duration):
+    _, cpu_start, _ = process_stats(pid)
+    time.sleep(duration)
+    rss, cpu_end, threads = process_stats(pid)
+    return rss, (cpu_end - cpu_start) / duration, threads
+
+
+class Clients:
+
+    # Idle SSE subscribers drained from one thread
+    def __init__(self, n, path="/events-imu"):
+        self.selector = selectors.DefaultSelector()
+        self.sockets = []
+        self.received = 0
+        self.run = True
+        request = f"GET {path} HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n".encode()
+        for _ in range(n):
+            sock = socket.create_connection(("127.0.0.1", PORT))
+            sock.sendall(request)
+            sock.setblocking(False)
+            self.selector.register(sock, selectors.EVENT_READ)
+            self.sockets.append(sock)
+        self.thread = threading.Thread(target=self.__drain, daemon=True)
+        self.thread.start()
+
+    def __drain(self):
+        while self.run:
+            for key, _ in self.selector.select(0.1):
+                try:
+                    self.received += len(key.fileobj.recv(65536))
+                except BlockingIOError:
+                    pass
+
+    def close(self):
+        self.run = False
+        self.thread.join()
+        for sock in self.sockets:
+            self.selector.unregister(sock)
+            sock.close()
+
+
+def wait_ready(timeout=30.0):
+    t_end = time.monotonic() + timeout
+    while time.monotonic() < t_end:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{PORT}/status", timeout=1.0) as response:
+                if json.load(response)["all_ready_after"] is not None:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError("server did not become ready")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", choices=SERVERS, default="asgi")
+    parser.add_argument("--clients", default="50,200", help="comma-separated subscriber counts")
+    parser.add_argument("--duration", type=float, default=5.0, help="measurement interval in seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, NAVIO_SIM="1", NAVIO_CALIBRATION_CACHE=os.path.join(directory, "calibration.json"))
+        server = subprocess.Popen([sys.executable] + SERVERS[args.server], cwd=ROOT, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready()
+            base_rss, base_cpu, base_threads = measure(server.pid, args.duration)
+            print(f"{args.server}: idle server {base_rss / 2**20:.1f} MiB, {100 * base_cpu:.1f}% CPU, "
+                  f"{base_threads} threads")
+            for n in (int(n) for n in args.clients.split(",")):
+                clients = Clients(n)
+                time.sleep(1.0)  # every subscription established
+                received = clients.received
+                rss, cpu, threads = measure(server.pid, args.duration)
+                rate = (clients.received - received) / args.duration
+                clients.close()
+                print(f"{args.server}: {n:4d} subscribers  {rss / 2**20:6.1f} MiB  "
+                      f"{(rss - base_rss) / n / 1024:6.1f} KiB/conn  {100 * cpu:5.1f}% CPU  "
+                      f"{100 * (cpu - base_cpu) / n:6.3f}% CPU/conn  {threads} threads  "
+                      f"{rate / n:7.0f} B/s/conn received")
+                time.sleep(1.0)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# Cold-start measurement: launches app.py on the simulated board and polls /status until the
+# server answers and every sensor is ready. Runs once with an empty calibration cache and once
+# with the cache filled by the first run.
+# usage: python -m bench.bench_startup [runs]
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATUS_URL = "http://127.0.0.1:5000/status"
+
+
+def measure(env, timeout=30.0):
+    t_launch = time.monotonic()
+    process = subprocess.Popen([sys.executable, "app.py"], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    t_server = None
+    try:
+        while time.monotonic() - t_launch < timeout:
+            try:
+                with urllib.request.urlopen(STATUS_URL, timeout=1.0) as response:
+                    status = json.load(response)
+            except OSError:
+                time.sleep(0.005)
+                continue
+            if t_server is None:
+                t_server = time.monotonic() - t_launch
+            if status["all_ready_after"] is not None:
+                return t_server, time.monotonic() - t_launch, status
+            time.sleep(0.005)
+        raise RuntimeError("app.py did not become ready")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, NAVIO_SIM="1", NAVIO_CALIBRATION_CACHE=os.path.join(directory, "calibration.json"))
+        for i in range(runs):
+            t_server, t_ready, status = measure(env)
+            sensors = "  ".join(f"{name} {sensor['ready_after']:.3f} s (init {sensor['init_time']:.3f} s)"
+                                for name, sensor in status["sensors"].items())
+            cache = "cold cache" if i == 0 else "warm cache"
+            print(f"run {i} ({cache}): first response {t_server:.3f} s, all sensors ready {t_ready:.3f} s "
+                  f"after launch; in process: {sensors}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+# Hardware-free benchmark suite for the navio hot paths, run against the navio.sim fake buses.
+# usage: python -m bench.run [-n SAMPLES] [-o results.json] [--compare previous.json] [names...]
+# Every benchmark reports samples/s, p50/p99 latency, retained blocks per sample and peak
+# traced memory, and the whole run is saved as JSON so results can be compared between commits.
+import os
+import json
+import time
+import argparse
+import subprocess
+import tracemalloc
+import navio.bus as navio_bus
+from navio.sim import Simulation
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def measure(step, samples, per_call=1):
+    # step() is timed call by call; per_call is the number of samples handled by one call
+    for _ in range(min(100, samples)):
+        step()
+    latencies = [0.0] * samples
+    t_start = time.perf_counter()
+    for i in range(samples):
+        t = time.perf_counter()
+        step()
+        latencies[i] = time.perf_counter() - t
+    total = time.perf_counter() - t_start
+    # Memory is traced in a separate untimed pass, tracemalloc slows allocations down. Blocks still
+    # allocated after the pass are summed per allocation site (frees elsewhere do not cancel them);
+    # tracemalloc does not see blocks freed within the pass, the peak covers those temporaries.
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(samples):
+        step()
+    peak = tracemalloc.get_traced_memory()[1]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    retained = sum(max(stat.count_diff, 0) for stat in
+                   after.filter_traces(filters).compare_to(before.filter_traces(filters), "traceback"))
+    latencies.sort()
+    return {
+        "samples_per_s": samples * per_call / total,
+        "p50_us": 1e6 * latencies[len(latencies) // 2] / per_call,
+        "p99_us": 1e6 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] / per_call,
+        "retained_blocks_per_sample": retained / (samples * per_call),
+        "peak_alloc_bytes": peak,
+    }
+
+
+@benchmark("mpu9250.read_all")
+def bench_read_all(simulation):
+    from navio.mpu9250 import MPU9250
+    mpu = MPU9250()
+    mpu.initialize()
+    return mpu.read_all, 1, {"spi_transfers_per_sample": lambda n: simulation.mpu9250.transfers / n}
+
+
+@benchmark("mpu9250.read_fifo")
+def bench_read_fifo(simulation):
+    from navio.mpu9250 import MPU9250
+    mpu = MPU9250()
+    mpu.initialize()
+    mpu.enable_fifo(0)
+
+    def step():
+        # Keep the simulated FIFO full so every call drains a complete block
+        simulation.mpu9250.t_sample -= 0.030
+        mpu.read_fifo()
+    return step, 30, {}
+
+
+@benchmark("fusion.update")
+def bench_fusion(simulation):
+    from navio.fusion import AttitudeFilter
+    from navio.sim import SyntheticIMU
+    source = SyntheticIMU()
+    engine = AttitudeFilter(frequency=500.0)
+    acc, gyro, mag, temp = source.sample(0.0)
+    return lambda: engine.update(gyro, acc, mag), 1, {}
+
+
+@benchmark("fusion.update_block")
+def bench_fusion_block(simulation):
+    import numpy as np
+    from navio.fusion import AttitudeFilter
+    from navio.sim import SyntheticIMU
+    source = SyntheticIMU()
+    samples = [source.sample(i / 500.0) for i in range(32)]
+    acc = np.array([s[0] for s in samples])
+    gyro = np.array([s[1] for s in samples])
+    mag = np.array([s[2] for s in samples])
+    engine = AttitudeFilter(frequency=500.0)
+    return lambda: engine.update_block(gyro, acc, mag), 32, {}
+
+
+@benchmark("barometer.calculate")
+def bench_baro_calculate(simulation):
+    from navio.barometer import Barometer
+    baro = Barometer()
+    baro.initialize()
+    return baro.calculate, 1, {}
+
+
+@benchmark("pwm.set_pwm")
+def bench_set_pwm(simulation):
+    from navio.pwm import NavioPWM
+    pwm = NavioPWM()
+    pwm.start()
+    start = simulation.i2c.transactions
+    channel = [0]
+
+    def step():
+        channel[0] = (channel[0] + 1) % 3
+        pwm.set_pwm(channel[0], 0.5)
+
+    def transactions(n):
+        pwm.bus.flush()
+        return (simulation.i2c.transactions - start) / n
+    return step, 1, {"i2c_transactions_per_call": transactions}
+
+
+def app_with_imu():
+    # app.imu with a filled sample ring and no driver or thread behind it
+    import app
+    from navio.imu import IMUManager
+    from navio.ringbuffer import SampleRing
+    from navio.sim import SyntheticIMU
+    imu = IMUManager.__new__(IMUManager)
+    imu.samples = SampleRing(IMUManager.FIELDS, 4096)
+    source = SyntheticIMU()
+    for i in range(4096):
+        acc, gyro, mag, temp = source.sample(i / 500.0)
+        imu.samples.append((time.time() - (4096 - i) / 500.0, *acc, *gyro, *mag, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0))
+    app.app.imu = imu
+    return app
+
+
+@benchmark("sse.encode_imu_json")
+def bench_sse_json(simulation):
+    app = app_with_imu()
+    return app.encode_imu, 1, {}
+
+
+@benchmark("sse.encode_imu_binary")
+def bench_sse_binary(simulation):
+    import navio.telemetry as navio_telemetry
+    app = app_with_imu()
+    signals = ("ax", "ay", "az", "gx", "gy", "gz", "mx", "my", "mz", "roll", "pitch", "yaw")
+    encoder = navio_telemetry.BinaryEncoder(signals, [app.app.imu.FIELDS.index(s) for s in signals])
+    # One message batches 50 samples (500 Hz IMU published at 10 Hz)
+    return lambda: encoder.encode(app.app.imu.window(50)), 50, {}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def run(names, samples):
+    results = {}
+    for name in names:
+        simulation = Simulation()
+        navio_bus.set_simulation(simulation)
+        simulation.mpu9250.transfers = 0
+        step, per_call, extras = BENCHMARKS[name](simulation)
+        simulation.mpu9250.transfers = 0
+        result = measure(step, samples, per_call)
+        calls = samples * 2 + min(100, samples)
+        line = (f"{name:24s} {result['samples_per_s']:12.0f} samples/s  p50 {result['p50_us']:8.2f} us  "
+                f"p99 {result['p99_us']:8.2f} us  retained blocks/sample {result['retained_blocks_per_sample']:6.2f}  "
+                f"peak {result['peak_alloc_bytes']:8d} B")
+        for extra, compute in extras.items():
+            result[extra] = compute(calls)
+            line += f"  {extra} {result[extra]:.2f}"
+        results[name] = result
+        print(line)
+    navio_bus.set_simulation(None)
+    return results
+
+
+def compare(results, previous):
+    for name, result in results.items():
+        if name in previous:
+            ratio = result["samples_per_s"] / previous[name]["samples_per_s"]
+            print(f"{name:24s} {ratio:6.2f}x throughput vs previous run")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all)")
+    parser.add_argument("-n", "--samples", type=int, default=2000)
+    parser.add_argument("-o", "--output", help="JSON file (default: bench/results/<revision>.json)")
+    parser.add_argument("--compare", help="previous JSON results to compare with")
+    args = parser.parse_args()
+
+    revision = git_revision()
+    results = run(args.names or list(BENCHMARKS), args.samples)
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", f"{revision}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"revision": revision, "time": time.time(), "samples": args.samples, "results": results}, f, indent=2)
+    print(f"Results saved to {output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)["results"])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+import time
+import signal
+import argparse
+import threading
+from navio.ringbuffer import SharedSampleRing
+from navio.history import TelemetryHistory
+
+
+# Acquisition outside of the web server: `python -m navio.acquisition` owns the MPU9250, the
+# MS5611 and the PCA9685 in its own process (own interpreter, own GIL) and publishes every IMU
+# and barometer sample into SharedSampleRing blocks named "<prefix>-imu" and "<prefix>-baro".
+# Web workers attach SensorReader instances, read-only, and drive the LED through the
+# NavioLEDManager datagram socket with navio.led.NavioLEDClient.
+
+PREFIX = "navio"
+IMU_CAPACITY = 4096
+BARO_CAPACITY = 1024
+
+
+def ring_name(prefix, sensor):
+    return f"{prefix}-{sensor}"
+
+
+class AcquisitionDaemon:
+
+    def __init__(self, prefix=PREFIX, fifo=True, interrupt_pin=None, cache=None):
+        self.prefix = prefix
+        self.fifo = fifo
+        self.interrupt_pin = interrupt_pin
+        self.cache = cache
+        self.rings = []
+        self.imu = None
+        self.baro = None
+        self.led = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        import navio.imu as navio_imu
+        import navio.barometer as navio_baro
+        import navio.led as navio_led
+        imu_ring = SharedSampleRing.create(ring_name(self.prefix, "imu"), navio_imu.IMUManager.FIELDS, IMU_CAPACITY)
+        baro_ring = SharedSampleRing.create(ring_name(self.prefix, "baro"), navio_baro.BarometerManager.FIELDS,
+                                            BARO_CAPACITY)
+        self.rings = [imu_ring, baro_ring]
+        self.baro = navio_baro.BarometerManager(cache=self.cache, samples=baro_ring)
+        self.baro.start()
+        if self.interrupt_pin is not None:
+            self.imu = navio_imu.IMUManager(cache=self.cache, interrupt_pin=self.interrupt_pin, samples=imu_ring)
+        else:
+            self.imu = navio_imu.IMUManager(fifo=self.fifo, cache=self.cache, samples=imu_ring)
+        self.imu.start()
+        self.led = navio_led.NavioLEDManager()
+        self.led.start()
+
+    def run(self):
+        # Until SIGTERM/SIGINT
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *args: self.stopped.set())
+        self.start()
+        try:
+            self.stopped.wait()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        for manager in (self.led, self.imu, self.baro):
+            if manager:
+                manager.shutdown()
+        self.led = self.imu = self.baro = None
+        for ring in self.rings:
+            ring.close()
+            ring.unlink()
+        self.rings = []
+
+
+class SensorReader:
+
+    # Manager-like read access to a sensor ring published by an AcquisitionDaemon: latest(),
+    # window(), since(), wait_update() and a history fed from the ring when it is queried
+
+    POLL_PERIOD = 0.005
+
+    def __init__(self, sensor, prefix=PREFIX, timeout=10.0):
+        # Waits up to `timeout` seconds for the daemon to create the ring
+        name = ring_name(prefix, sensor)
+        t_end = time.monotonic() + timeout
+        while True:
+            try:
+                self.samples = SharedSampleRing.attach(name)
+                break
+            except FileNotFoundError:
+                if time.monotonic() > t_end:
+                    raise TimeoutError(f"No acquisition process publishing {name}")
+                time.sleep(0.05)
+        self.sensor = sensor
+        self.FIELDS = self.samples.fields
+        self.__history = TelemetryHistory(self.FIELDS[1:])
+        self.__history_t = 0.0
+        self.lock = threading.Lock()
+
+    def latest(self):
+        return self.samples.latest()
+
+    def window(self, n, copy=False):
+        return self.samples.window(n, copy)
+
+    def since(self, t, copy=False):
+        return self.samples.since(t, copy)
+
+    def get_data(self):
+        # IMUManager.get_data() equivalent
+        sample = self.latest()
+        if sample is None:
+            return ([0.0, 0.0, 0.0], [0.0, 0.0, 0.0], [0.0, 0.0, 0.0], [0.0, 0.0, 0.0])
+        return (sample[1:4].tolist(), sample[4:7].tolist(), sample[7:10].tolist(), sample[14:17].tolist())
+
+    def wait_update(self, timeout=None):
+        # Polls the ring's sample count, there is no cross-process notification
+        count = self.samples.count
+        t_end = None if timeout is None else time.monotonic() + timeout
+        while self.samples.count == count:
+            if t_end is not None and time.monotonic() >= t_end:
+                return False
+            time.sleep(self.POLL_PERIOD)
+        return True
+
+    @property
+    def history(self):
+        # Samples older than the ring capacity at the time of the query are not in the history
+        with self.lock:
+            block = self.samples.since(self.__history_t, copy=True)
+            if len(block):
+                self.__history.add_block(block[:, 0], block[:, 1:])
+                self.__history_t = block[-1, 0]
+            return self.__history
+
+    def stats(self):
+        return {"mode": "shared-memory", "samples": self.samples.count}
+
+    def shutdown(self):
+        self.samples.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Navio sensor acquisition process")
+    parser.add_argument("--prefix", default=PREFIX, help="shared memory name prefix")
+    parser.add_argument("--interrupt-pin", type=int, help="GPIO wired to the MPU9250 INT output")
+    parser.add_argument("--no-fifo", action="store_true", help="poll single IMU samples instead of the FIFO")
+    args = parser.parse_args()
+    import navio.calibration as navio_calibration
+    daemon = AcquisitionDaemon(args.prefix, not args.no_fifo, args.interrupt_pin,
+                               navio_calibration.CalibrationCache())
+    daemon.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+# LED animations compiled ahead of time. A pattern function returns RGB intensity frames (0..1,
+# perceived brightness) sampled every STEP seconds; Animation turns them once into the PCA9685
+# writes to perform: gamma-corrected 12-bit duty cycles through a lookup table, inverted for the
+# active-low Navio LED, run-length encoded, and reduced to the channels that change from one
+# entry to the next. Playing an animation is then an index increment and a dict lookup per entry.
+
+STEP = 0.01
+GAMMA = 2.2
+GAMMA_TABLE = [round(4095 * (i / 255) ** GAMMA) for i in range(256)]
+
+WHITE = (1.0, 1.0, 1.0)
+RED = (1.0, 0.0, 0.0)
+GREEN = (0.0, 1.0, 0.0)
+BLUE = (0.0, 0.0, 1.0)
+YELLOW = (1.0, 1.0, 0.0)
+PURPLE = (1.0, 0.0, 1.0)
+CYAN = (0.0, 1.0, 1.0)
+
+
+class Animation:
+
+    def __init__(self, frames, channels, brightness=1.0, loop=True, inverted=True, step=STEP):
+        # frames: RGB intensity triples, channels: PWM channel of each color component
+        self.loop = loop
+        self.step = step
+        counts = []
+        for frame in frames:
+            frame_counts = tuple(GAMMA_TABLE[round(255 * min(1.0, max(0.0, value * brightness)))] for value in frame)
+            if inverted:
+                frame_counts = tuple(4095 - count for count in frame_counts)
+            if counts and counts[-1][0] == frame_counts:
+                counts[-1][1] += 1
+            else:
+                counts.append([frame_counts, 1])
+        if loop and len(counts) > 1 and counts[0][0] == counts[-1][0]:
+            counts[0][1] += counts.pop()[1]
+        # entries: (changed {channel: duty}, duration in seconds); entry 0 holds the changes from the
+        # last entry, for looping, and `first` every channel, to start playing
+        self.entries = []
+        for i, (frame_counts, ticks) in enumerate(counts):
+            previous = counts[i - 1][0] if i or loop else (None,) * len(frame_counts)
+            changes = {channel: self.duty(count) for channel, count, before in zip(channels, frame_counts, previous)
+                       if count != before}
+            self.entries.append((changes, ticks * step))
+        self.first = {channel: self.duty(count) for channel, count in zip(channels, counts[0][0])}
+        self.duration = sum(duration for _, duration in self.entries)
+
+    @staticmethod
+    def duty(count):
+        # Half a count above the target so NavioPWM's int(duty * 4095) lands exactly on it
+        return min(1.0, (count + 0.5) / 4095)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def ramp(start, end, duration, step=STEP):
+    n = max(1, int(round(duration / step)))
+    return [tuple(a + (b - a) * i / n for a, b in zip(start, end)) for i in range(n)]
+
+
+def hold(color, duration, step=STEP):
+    return [tuple(color)] * max(1, int(round(duration / step)))
+
+
+def solid(color):
+    return [tuple(color)]
+
+
+def breathe(color, fade_in=1.0, on=0.0, fade_out=0.5, off=0.0, step=STEP):
+    # Same timing as the former NavioLED.pulse() defaults
+    black = (0.0, 0.0, 0.0)
+    frames = ramp(black, color, fade_in, step)
+    if on > 0:
+        frames += hold(color, on, step)
+    frames += ramp(color, black, fade_out, step)
+    if off > 0:
+        frames += hold(black, off, step)
+    return frames
+
+
+def blink(color, count=1, on=0.15, off=0.15, pause=1.0, step=STEP):
+    # Blink code: `count` flashes then a pause
+    black = (0.0, 0.0, 0.0)
+    frames = []
+    for _ in range(count):
+        frames += hold(color, on, step) + hold(black, off, step)
+    return frames + hold(black, pause, step)
+
+
+def cycle(colors=(RED, YELLOW, GREEN, CYAN, BLUE, PURPLE), hold_time=0.5, fade=1.0, step=STEP):
+    # Cross-fades through `colors` and back to the first one
+    frames = []
+    for i, color in enumerate(colors):
+        frames += hold(color, hold_time, step) + ramp(color, colors[(i + 1) % len(colors)], fade, step)
+    return frames
+
+
+def heartbeat(color, period=1.2, step=STEP):
+    black = (0.0, 0.0, 0.0)
+    frames = ramp(black, color, 0.08, step) + ramp(color, black, 0.12, step)
+    frames += ramp(black, color, 0.08, step) + ramp(color, black, 0.2, step)
+    return frames + hold(black, max(step, period - 0.48), step)
+
+
+# System status patterns (their color is part of the pattern)
+STATUS = {
+    "ok": lambda: breathe(GREEN, fade_in=1.5, on=0.0, fade_out=1.5),
+    "busy": lambda: heartbeat(BLUE),
+    "warning": lambda: blink(YELLOW, count=2),
+    "error": lambda: blink(RED, count=3, on=0.1, off=0.1, pause=0.6),
+}
+
+# Patterns taking a color
+PATTERNS = {
+    "solid": solid,
+    "breathe": breathe,
+    "blink": blink,
+    "heartbeat": heartbeat,
+}
+
+
+def compile_pattern(name, color, channels, brightness=1.0, **params):
+    # name: a PATTERNS entry, "cycle" or "status-<STATUS entry>"
+    if name.startswith("status-"):
+        frames = STATUS[name[len("status-"):]]()
+    elif name == "cycle":
+        frames = cycle(**params)
+    elif name in PATTERNS:
+        frames = PATTERNS[name](color, **params)
+    else:
+        raise ValueError(f"Unknown LED pattern: {name}")
+    return Animation(frames, channels, brightness)
@@ -1,6 +1,10 @@
 import time
 import threading
-from smbus import SMBus
+from navio.history import TelemetryHistory
+from navio.ringbuffer import SampleRing
+import navio.bus as navio_bus
+import navio.scheduler as navio_scheduler
+from navio.calibration import crc4
 
 
 class Barometer:
@@ -33,8 +37,16 @@ class Barometer:
     __MS5611_RA_D2_OSR_2048   = 0x56
     __MS5611_RA_D2_OSR_4096   = 0x58
 
-    def __init__(self):
-        self.bus = SMBus(1)
+    # Conversion commands and maximum conversion times (datasheet) per oversampling ratio
+    __D1_COMMANDS = {256: __MS5611_RA_D1_OSR_256, 512: __MS5611_RA_D1_OSR_512, 1024: __MS5611_RA_D1_OSR_1024,
+                     2048: __MS5611_RA_D1_OSR_2048, 4096: __MS5611_RA_D1_OSR_4096}
+    __D2_COMMANDS = {256: __MS5611_RA_D2_OSR_256, 512: __MS5611_RA_D2_OSR_512, 1024: __MS5611_RA_D2_OSR_1024,
+                     2048: __MS5611_RA_D2_OSR_2048, 4096: __MS5611_RA_D2_OSR_4096}
+    __CONVERSION_TIME = {256: 0.00060, 512: 0.00117, 1024: 0.00228, 2048: 0.00454, 4096: 0.00904}
+
+    def __init__(self, osr=4096, temperature_ratio=1, cache=None):
+        self.bus = navio_bus.open_i2c(1, "ms5611", navio_bus.I2CArbiter.HIGH)
+        self.cache = cache # navio.calibration.CalibrationCache for the PROM coefficients
         self.address = 0x77
         self.c1 = 0
         self.c2 = 0
@@ -46,33 +58,57 @@ class Barometer:
         self.d2 = 0
         self.temperature = 0.0 # Calculated temperature
         self.pressure = 0.0 # Calculated Pressure
+        self.pending = None # Conversion in progress: "d1", "d2" or None
+        self.deadline = 0.0 # time.monotonic() at which the pending conversion is complete
+        self.pressure_count = 0
+        self.set_osr(osr, temperature_ratio)
+
+    def set_osr(self, osr, temperature_ratio=None):
+        # temperature_ratio: number of pressure conversions per temperature conversion
+        if osr not in self.__CONVERSION_TIME:
+            raise ValueError(f"Unsupported OSR: {osr} (expected one of {sorted(self.__CONVERSION_TIME)})")
+        if temperature_ratio is not None:
+            if int(temperature_ratio) < 1:
+                raise ValueError(f"Invalid temperature ratio: {temperature_ratio}")
+            self.temperature_ratio = int(temperature_ratio)
+        self.osr = osr
+        self.conversion_time = self.__CONVERSION_TIME[osr]
+        self.d1_command = self.__D1_COMMANDS[osr]
+        self.d2_command = self.__D2_COMMANDS[osr]
+
+    def read_prom(self, index):
+        return int.from_bytes(self.bus.read_i2c_block_data(self.address, self.__MS5611_RA_C0 + 2 * index, 2), byteorder='big')
 
     def initialize(self):
-        self.c1 = int.from_bytes(self.bus.read_i2c_block_data(self.address, self.__MS5611_RA_C1, 2), byteorder='big')
-        #time.sleep(0.05)
-        self.c2 = int.from_bytes(self.bus.read_i2c_block_data(self.address, self.__MS5611_RA_C2, 2), byteorder='big')
-        #time.sleep(0.05)
-        self.c3 = int.from_bytes(self.bus.read_i2c_block_data(self.address, self.__MS5611_RA_C3, 2), byteorder='big')
-        #time.sleep(0.05)
-        self.c4 = int.from_bytes(self.bus.read_i2c_block_data(self.address, self.__MS5611_RA_C4, 2), byteorder='big')
-        #time.sleep(0.05)
-        self.c5 = int.from_bytes(self.bus.read_i2c_block_data(self.address, self.__MS5611_RA_C5, 2), byteorder='big')
-        #time.sleep(0.05)
-        self.c6 = int.from_bytes(self.bus.read_i2c_block_data(self.address, self.__MS5611_RA_C6, 2), byteorder='big')
+        # The PROM is taken from the calibration cache when its CRC word matches the sensor's
+        prom = self.cache.get("ms5611_prom") if self.cache else None
+        if prom is None or len(prom) != 8 or crc4(prom) != prom[7] & 0x0F or self.read_prom(7) != prom[7]:
+            prom = [self.read_prom(i) for i in range(8)]
+            if crc4(prom) != prom[7] & 0x0F:
+                raise IOError("MS5611 PROM CRC mismatch")
+            if self.cache:
+                self.cache.put("ms5611_prom", prom)
+        self.c1, self.c2, self.c3, self.c4, self.c5, self.c6 = prom[1:7]
 
         self.update()
 
     def refresh_pressure(self):
-        self.bus.write_byte(self.address, self.__MS5611_RA_D1_OSR_4096)
+        self.bus.write_byte(self.address, self.d1_command)
+        self.pending = "d1"
+        self.deadline = time.monotonic() + self.conversion_time
 
     def refresh_temperature(self):
-        self.bus.write_byte(self.address, self.__MS5611_RA_D2_OSR_4096)
+        self.bus.write_byte(self.address, self.d2_command)
+        self.pending = "d2"
+        self.deadline = time.monotonic() + self.conversion_time
 
     def read_pressure(self):
         self.d1 = int.from_bytes(self.bus.read_i2c_block_data(self.address, self.__MS5611_RA_ADC, 3), byteorder='big')
+        self.pending = None
 
     def read_temperature(self):
         self.d2 = int.from_bytes(self.bus.read_i2c_block_data(self.address, self.__MS5611_RA_ADC, 3), byteorder='big')
+        self.pending = None
 
     def calculate(self):
         dt = self.d2 - self.c5*2**8
@@ -107,40 +143,89 @@ class Barometer:
 
     def update(self):
         self.refresh_pressure()
-        time.sleep(0.01) # Waiting for pressure data ready
+        time.sleep(self.conversion_time) # Waiting for pressure data ready
         self.read_pressure()
 
         self.refresh_temperature()
-        time.sleep(0.01) # Waiting for temperature data ready
+        time.sleep(self.conversion_time) # Waiting for temperature data ready
         self.read_temperature()
 
         self.calculate()
 
+    def step(self, now=None):
+        # Non-blocking conversion state machine, to be called again at self.deadline.
+        # Reads the finished conversion and immediately starts the next one (a temperature
+        # conversion every `temperature_ratio` pressure conversions), so the sensor is never idle.
+        # Returns True when a new pressure has been calculated.
+        if self.pending is None:
+            self.refresh_temperature()
+            return False
+        if (time.monotonic() if now is None else now) < self.deadline:
+            return False
+        if self.pending == "d2":
+            self.read_temperature()
+            self.refresh_pressure()
+            return False
+        self.read_pressure()
+        self.pressure_count += 1
+        if self.pressure_count % self.temperature_ratio == 0:
+            self.refresh_temperature()
+        else:
+            self.refresh_pressure()
+        self.calculate()
+        return True
+
 
 class BarometerManager:
 
-    def __init__(self):
-        self.baro = Barometer()
-        self.run = False
-        self.t_update = None
+    FIELDS = ("t", "Ps", "OAT")
+
+    def __init__(self, osr=4096, temperature_ratio=4, cache=None, scheduler=None, ring_capacity=1024, samples=None):
+        # samples: ring to publish into (e.g. a navio.ringbuffer.SharedSampleRing), FIELDS columns
+        self.baro = Barometer(osr, temperature_ratio, cache)
+        self.scheduler = scheduler or navio_scheduler.get_scheduler()
+        self.task = None
+        self.updated = threading.Condition()
+        self.samples = samples if samples is not None else SampleRing(self.FIELDS, ring_capacity)
+        self.history = TelemetryHistory(self.FIELDS[1:])
+        self.recorder = None  # navio.recorder.Recorder with BARO_DTYPE records
 
     def __update(self):
-        while self.run:
-            self.baro.update()
-            time.sleep(0.5)
+        if self.baro.step():
+            t = time.time()
+            sample = (t, self.baro.get_pressure(), self.baro.get_temperature())
+            self.samples.append(sample)
+            self.history.add(t, sample[1:])
+            recorder = self.recorder  # cleared by /runrec from another thread
+            if recorder:
+                recorder.record((t, self.baro.d1, self.baro.d2, self.baro.pressure, self.baro.temperature))
+            with self.updated:
+                self.updated.notify_all()
+        # Next run when the pending conversion is complete
+        return self.baro.deadline
+
+    def wait_update(self, timeout=None):
+        with self.updated:
+            return self.updated.wait(timeout)
+
+    def latest(self):
+        return self.samples.latest()
+
+    def window(self, n, copy=False):
+        return self.samples.window(n, copy)
+
+    def since(self, t, copy=False):
+        return self.samples.since(t, copy)
 
     def get_data_str(self):
         return f"OAT: {self.baro.get_temperature():.1f}degC / Ps: {self.baro.get_pressure():.0f}mb"
 
     def start(self):
-        if not self.t_update:
+        if not self.task:
             self.baro.initialize()
-            self.run = True
-            self.t_update = threading.Thread(target=self.__update)
-            self.t_update.start()
+            self.task = self.scheduler.add("baro", self.__update, self.baro.conversion_time)
 
     def shutdown(self):
-        self.run = False
-        if self.t_update:
-            self.t_update.join()
-            self.t_update = None
+        if self.task:
+            self.scheduler.remove(self.task)
+            self.task = None
@@ -0,0 +1,166 @@
+import time
+import asyncio
+import threading
+from collections import deque
+import navio.metrics as navio_metrics
+
+
+class Subscriber:
+
+    def __init__(self, maxsize, loop=None):
+        self.queue = deque(maxlen=maxsize)  # drop-oldest when a client falls behind
+        self.dropped = 0
+        self.loop = loop  # event loop of an astream() subscriber
+        self.ready = asyncio.Event() if loop else None
+
+
+class Broadcaster:
+
+    # One producer thread per stream: it waits for the source to report a new sample, encodes it
+    # once with `encode` and fans the resulting frame out to every subscriber queue.
+    # `wait_update(timeout)` must block until a new sample is available and return True, or return
+    # False on timeout. `encode()` may return None when there is nothing to send.
+    # `min_period` caps the publishing rate of fast sources.
+    # stream() serves a subscriber from a blocked thread, astream() from an event loop: publish()
+    # wakes each loop once per frame, the loop then sets the events of its own subscribers.
+
+    def __init__(self, encode, wait_update, min_period=0.0, maxsize=16, name=None):
+        # `name` labels the stream in the metrics (navio_sse_*{stream=name}), None leaves it out
+        self.encode = encode
+        self.wait_update = wait_update
+        self.min_period = min_period
+        self.maxsize = maxsize
+        self.subscribers = set()
+        self.cond = threading.Condition()
+        self.frames = 0
+        self.dropped = 0
+        self.run = False
+        self.t_update = None
+        self.encode_metric = None
+        if name:
+            navio_metrics.gauge_callback("navio_sse_subscribers", "Connected SSE clients",
+                                         lambda: len(self.subscribers), stream=name)
+            navio_metrics.gauge_callback("navio_sse_queue_depth", "Frames waiting in the fullest client queue",
+                                         self.queue_depth, stream=name)
+            navio_metrics.counter_callback("navio_sse_frames_total", "Frames published",
+                                           lambda: self.frames, stream=name)
+            navio_metrics.counter_callback("navio_sse_dropped_frames_total", "Frames dropped for slow clients",
+                                           lambda: self.dropped, stream=name)
+            self.encode_metric = navio_metrics.histogram("navio_sse_encode_seconds", "Time to encode a frame",
+                                                         stream=name)
+
+    def queue_depth(self):
+        with self.cond:
+            return max((len(sub.queue) for sub in self.subscribers), default=0)
+
+    def subscribe(self, loop=None):
+        sub = Subscriber(self.maxsize, loop)
+        with self.cond:
+            self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.cond:
+            self.subscribers.discard(sub)
+
+    def publish(self, frame):
+        loops = set()
+        with self.cond:
+            for sub in self.subscribers:
+                if len(sub.queue) == self.maxsize:
+                    sub.dropped += 1
+                    self.dropped += 1
+                sub.queue.append(frame)
+                if sub.loop:
+                    loops.add(sub.loop)
+            self.frames += 1
+            self.cond.notify_all()
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self.__wake, loop)
+            except RuntimeError:
+                pass  # loop closed
+
+    def __wake(self, loop):
+        # Runs in `loop`
+        with self.cond:
+            subscribers = [sub for sub in self.subscribers if sub.loop is loop]
+        for sub in subscribers:
+            sub.ready.set()
+
+    def get(self, sub, timeout=None):
+        # Every frame queued for this subscriber, oldest first (empty on timeout or shutdown)
+        with self.cond:
+            self.cond.wait_for(lambda: sub.queue or not self.run, timeout)
+            frames = list(sub.queue)
+            sub.queue.clear()
+        return frames
+
+    def stream(self, preamble=None):
+        # Generator for a streaming HTTP response, the subscription ends when the client disconnects.
+        # `preamble` is sent once before the first frame.
+        sub = self.subscribe()
+        try:
+            if preamble:
+                yield preamble
+            while self.run:
+                frames = self.get(sub, timeout=1.0)
+                if frames:
+                    yield b"".join(frames)
+        finally:
+            self.unsubscribe(sub)
+
+    async def astream(self, preamble=None):
+        # Async generator version of stream(), for ASGI servers. Ends with the broadcaster or when
+        # the consuming task is cancelled.
+        sub = self.subscribe(asyncio.get_running_loop())
+        try:
+            if preamble:
+                yield preamble
+            while self.run:
+                await sub.ready.wait()  # set by publish() and shutdown()
+                sub.ready.clear()
+                with self.cond:
+                    frames = list(sub.queue)
+                    sub.queue.clear()
+                if frames:
+                    yield b"".join(frames)
+        finally:
+            self.unsubscribe(sub)
+
+    def __update(self):
+        t_last = 0.0
+        while self.run:
+            if not self.wait_update(timeout=1.0):
+                continue
+            if not self.subscribers:
+                continue
+            delay = self.min_period - (time.monotonic() - t_last)
+            if delay > 0:
+                time.sleep(delay)
+            t_last = time.monotonic()
+            frame = self.encode()
+            if self.encode_metric:
+                self.encode_metric.observe(time.monotonic() - t_last)
+            if frame is not None:
+                self.publish(frame)
+
+    def start(self):
+        if not self.t_update:
+            self.run = True
+            self.t_update = threading.Thread(target=self.__update)
+            self.t_update.start()
+
+    def shutdown(self):
+        self.run = False
+        with self.cond:
+            self.cond.notify_all()
+            loops = {sub.loop for sub in self.subscribers if sub.loop}
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self.__wake, loop)
+            except RuntimeError:
+                pass
+        if self.t_update:
+            self.t_update.join()
+            self.t_update = None
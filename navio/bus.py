@@ -0,0 +1,323 @@
+import os
+import time
+import heapq
+import collections
+import itertools
+import threading
+import navio.metrics as navio_metrics
+
+# Hardware access points used by the navio drivers. On the Pi they return spidev / smbus / gpiozero
+# objects; when a simulation is installed (set_simulation(), or NAVIO_SIM=1 in the environment)
+# they return the register-level fakes of navio.sim instead, so the drivers, managers and the
+# Flask app run unchanged on any Linux box.
+
+_simulation = None
+
+
+def set_simulation(simulation):
+    global _simulation
+    _simulation = simulation
+
+
+def get_simulation():
+    global _simulation
+    if _simulation is None and os.environ.get("NAVIO_SIM"):
+        from navio.sim import Simulation
+        _simulation = Simulation.from_env()
+    return _simulation
+
+
+def open_spi(bus_number, dev_number):
+    simulation = get_simulation()
+    if simulation:
+        return simulation.open_spi(bus_number, dev_number)
+    import spidev
+    spi = spidev.SpiDev()
+    spi.open(bus_number, dev_number)
+    return spi
+
+
+class TimedSMBus:
+
+    # SMBus wrapper recording the latency of every transaction of one device in
+    # navio_i2c_transaction_seconds{device, op}
+
+    def __init__(self, bus, device):
+        self.bus = bus
+        self.device = device
+        self.metrics = {op: navio_metrics.histogram("navio_i2c_transaction_seconds", "Latency of I2C transactions",
+                                                    device=device, op=op)
+                        for op in ("write_byte", "write_byte_data", "write_i2c_block_data", "read_byte_data",
+                                   "read_i2c_block_data")}
+
+    def write_byte(self, address, value):
+        t = time.perf_counter()
+        result = self.bus.write_byte(address, value)
+        self.metrics["write_byte"].observe(time.perf_counter() - t)
+        return result
+
+    def write_byte_data(self, address, reg, value):
+        t = time.perf_counter()
+        result = self.bus.write_byte_data(address, reg, value)
+        self.metrics["write_byte_data"].observe(time.perf_counter() - t)
+        return result
+
+    def write_i2c_block_data(self, address, reg, data):
+        t = time.perf_counter()
+        result = self.bus.write_i2c_block_data(address, reg, data)
+        self.metrics["write_i2c_block_data"].observe(time.perf_counter() - t)
+        return result
+
+    def read_byte_data(self, address, reg):
+        t = time.perf_counter()
+        result = self.bus.read_byte_data(address, reg)
+        self.metrics["read_byte_data"].observe(time.perf_counter() - t)
+        return result
+
+    def read_i2c_block_data(self, address, reg, length):
+        t = time.perf_counter()
+        result = self.bus.read_i2c_block_data(address, reg, length)
+        self.metrics["read_i2c_block_data"].observe(time.perf_counter() - t)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.bus, name)
+
+
+class I2CTransaction:
+
+    def __init__(self, client, op, args, wait):
+        self.client = client
+        self.op = op
+        self.args = args
+        self.t_queued = time.perf_counter()
+        self.done = threading.Event() if wait else None
+        self.queued = True
+        self.result = None
+        self.error = None
+
+
+class I2CArbiter:
+
+    # Owns one I2C bus and runs the transactions of every driver on it from a single worker
+    # thread. Pending transactions run by client priority (lowest value first), then in submission
+    # order, so the transactions of one client never reorder. Reads and writes block the caller
+    # until the worker has run them; post_write_block() queues a write without waiting, and
+    # replaces the client's previous posted write to the same register while it is still queued
+    # (e.g. LED updates arriving faster than the bus is free). The time each transaction waits
+    # for the bus is recorded per client in navio_i2c_queue_seconds{client}.
+
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.cond = threading.Condition()
+        self.queue = []  # heap of (priority, sequence number, I2CTransaction)
+        self.sequence = itertools.count()
+        self.clients = []
+        self.worker = None
+
+    def client(self, device=None, priority=NORMAL):
+        client = I2CClient(self, device, priority)
+        with self.cond:
+            self.clients.append(client)
+        return client
+
+    def submit(self, transaction):
+        with self.cond:
+            heapq.heappush(self.queue, (transaction.client.priority, next(self.sequence), transaction))
+            transaction.client.last = transaction
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.__run, name="i2c", daemon=True)
+                self.worker.start()
+            self.cond.notify()
+
+    def coalesce(self, client, op, args):
+        # Replaces the arguments of the client's last transaction if it is a still queued `op` to
+        # the same address and register writing at least as many bytes
+        with self.cond:
+            last = client.last
+            if (last is None or not last.queued or last.done is not None or last.op != op or
+                    last.args[:2] != args[:2] or len(args[2]) < len(last.args[2])):
+                return False
+            last.args = args
+            client.coalesced += 1
+            client.coalesced_metric.inc()
+            return True
+
+    def stats(self):
+        with self.cond:
+            return {client.device or "default": client.stats() for client in self.clients}
+
+    def __run(self):
+        while True:
+            with self.cond:
+                while not self.queue:
+                    self.cond.wait()
+                transaction = heapq.heappop(self.queue)[2]
+                transaction.queued = False
+            client = transaction.client
+            if transaction.op is None:
+                transaction.done.set()  # flush() marker
+                continue
+            latency = time.perf_counter() - transaction.t_queued
+            client.queue_metric.observe(latency)
+            client.transactions += 1
+            client.total_latency += latency
+            client.max_latency = max(client.max_latency, latency)
+            try:
+                transaction.result = getattr(client.bus, transaction.op)(*transaction.args)
+            except Exception as e:
+                transaction.error = e
+                client.errors += 1
+                client.last_error = f"{type(e).__name__}: {e}"
+                if transaction.done is None:
+                    print(f"Error: I2C {transaction.op} from {client.device} failed ({client.last_error})")
+            if transaction.done is not None:
+                transaction.done.set()
+
+
+class I2CClient:
+
+    # smbus.SMBus interface of one driver on an I2CArbiter bus
+
+    def __init__(self, arbiter, device, priority):
+        self.arbiter = arbiter
+        self.device = device
+        self.priority = priority
+        self.bus = TimedSMBus(arbiter.bus, device) if device else arbiter.bus
+        self.last = None  # last submitted transaction
+        self.transactions = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.last_error = None
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.queue_metric = navio_metrics.histogram(
+            "navio_i2c_queue_seconds", "Time I2C transactions wait for the bus", client=device or "default")
+        self.coalesced_metric = navio_metrics.counter(
+            "navio_i2c_coalesced_writes_total", "Queued I2C writes replaced by a newer write", client=device or "default")
+
+    def __call(self, op, *args):
+        transaction = I2CTransaction(self, op, args, True)
+        self.arbiter.submit(transaction)
+        transaction.done.wait()
+        if transaction.error is not None:
+            raise transaction.error
+        return transaction.result
+
+    def write_byte(self, address, value):
+        return self.__call("write_byte", address, value)
+
+    def write_byte_data(self, address, reg, value):
+        return self.__call("write_byte_data", address, reg, value)
+
+    def write_i2c_block_data(self, address, reg, data):
+        return self.__call("write_i2c_block_data", address, reg, data)
+
+    def read_byte_data(self, address, reg):
+        return self.__call("read_byte_data", address, reg)
+
+    def read_i2c_block_data(self, address, reg, length):
+        return self.__call("read_i2c_block_data", address, reg, length)
+
+    def post_write_block(self, address, reg, data):
+        # Block write without waiting for the bus, errors are counted and printed by the worker
+        args = (address, reg, data)
+        if not self.arbiter.coalesce(self, "write_i2c_block_data", args):
+            self.arbiter.submit(I2CTransaction(self, "write_i2c_block_data", args, False))
+
+    def flush(self):
+        # Waits for the posted writes of this client
+        transaction = I2CTransaction(self, None, (), True)
+        self.arbiter.submit(transaction)
+        transaction.done.wait()
+
+    def close(self):
+        # The bus stays open for the other clients of the arbiter
+        self.flush()
+
+    def stats(self):
+        transactions = max(self.transactions, 1)
+        return {
+            "priority": self.priority,
+            "transactions": self.transactions,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "mean_queue_latency": self.total_latency / transactions,
+            "max_queue_latency": self.max_latency,
+        }
+
+
+_arbiters = {}
+_arbiters_lock = threading.Lock()
+
+
+def get_i2c_arbiter(bus_number):
+    # One arbiter per bus (and per installed simulation)
+    simulation = get_simulation()
+    with _arbiters_lock:
+        arbiter = _arbiters.get((simulation, bus_number))
+        if arbiter is None:
+            if simulation:
+                bus = simulation.open_i2c(bus_number)
+            else:
+                from smbus import SMBus
+                bus = SMBus(bus_number)
+            arbiter = _arbiters[(simulation, bus_number)] = I2CArbiter(bus)
+        return arbiter
+
+
+def open_i2c(bus_number, device=None, priority=I2CArbiter.NORMAL):
+    # `device` names the client for the transaction and queueing latency metrics, `priority`
+    # orders its transactions against the other drivers on the bus
+    return get_i2c_arbiter(bus_number).client(device, priority)
+
+
+def output_pin(pin):
+    simulation = get_simulation()
+    if simulation:
+        return simulation.output_pin(pin)
+    from gpiozero import LED
+    return LED(pin)
+
+
+class EdgeInput:
+
+    # Rising edges of a GPIO input, timestamped with time.time() by the gpiozero callback thread
+    # as soon as the edge is reported, and queued until wait_edge() collects them
+
+    def __init__(self, pin):
+        from gpiozero import DigitalInputDevice
+        self.device = DigitalInputDevice(pin)
+        self.edges = collections.deque(maxlen=256)
+        self.cond = threading.Condition()
+        self.device.when_activated = self.__edge
+
+    def __edge(self):
+        t = time.time()
+        with self.cond:
+            self.edges.append(t)
+            self.cond.notify()
+
+    def wait_edge(self, timeout=None):
+        # Returns (time of the latest edge, edges since the previous call), or None on timeout
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.edges, timeout):
+                return None
+            edge = self.edges[-1], len(self.edges)
+            self.edges.clear()
+            return edge
+
+    def close(self):
+        self.device.close()
+
+
+def input_pin(pin):
+    simulation = get_simulation()
+    if simulation:
+        return simulation.input_pin(pin)
+    return EdgeInput(pin)
@@ -0,0 +1,73 @@
+import os
+import json
+import zlib
+import threading
+import navio.bus as navio_bus
+
+
+def crc4(prom):
+    # MS5611 PROM CRC (AN520), computed with the CRC word itself masked out
+    words = list(prom)
+    words[7] &= 0xFF00
+    remainder = 0
+    for i in range(16):
+        byte = words[i >> 1] & 0xFF if i & 1 else words[i >> 1] >> 8
+        remainder ^= byte
+        for _ in range(8):
+            remainder = ((remainder << 1) ^ 0x3000) if remainder & 0x8000 else remainder << 1
+            remainder &= 0xFFFF
+    return (remainder >> 12) & 0x0F
+
+
+class CalibrationCache:
+
+    # Factory constants that never change for a given board (MS5611 PROM, AK8963 sensitivity
+    # adjustment) kept in a JSON file so they are not read again from the sensors at every start.
+    # Drivers check an entry against the device before trusting it (PROM CRC word, ASA bytes).
+    # Each entry carries a CRC-32 of its values, a corrupted or hand-edited entry is ignored.
+    # NAVIO_CALIBRATION_CACHE overrides the location, an empty value disables the cache.
+    # Simulated boards use their own file so their values never end up on real hardware.
+
+    DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "navio")
+
+    def __init__(self, path=None):
+        if path is None:
+            name = "calibration-sim.json" if navio_bus.get_simulation() else "calibration.json"
+            path = os.environ.get("NAVIO_CALIBRATION_CACHE", os.path.join(self.DEFAULT_DIRECTORY, name))
+        self.path = path
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def checksum(values):
+        return zlib.crc32(json.dumps(values).encode())
+
+    def __load(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def get(self, key):
+        if not self.path:
+            return None
+        with self.lock:
+            entry = self.__load().get(key)
+        if not isinstance(entry, dict) or entry.get("crc") != self.checksum(entry.get("values")):
+            return None
+        return entry["values"]
+
+    def put(self, key, values):
+        if not self.path:
+            return
+        with self.lock:
+            entries = self.__load()
+            entries[key] = {"values": values, "crc": self.checksum(values)}
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path + ".tmp", "w") as f:
+                    json.dump(entries, f)
+                os.replace(self.path + ".tmp", self.path)
+            except OSError as e:
+                print(f"Warning: calibration cache not saved ({e})")
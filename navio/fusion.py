@@ -0,0 +1,212 @@
+import math
+import numpy as np
+
+
+class AttitudeFilter:
+
+    # Mahony / Madgwick attitude estimation on scalar floats, equivalent to ahrs.filters.Mahony and
+    # ahrs.filters.Madgwick (updateMARG / updateIMU) but without building NumPy arrays per sample.
+    # update_block() integrates a whole block of samples per call and writes the resulting
+    # quaternions and roll/pitch/yaw angles into preallocated arrays.
+
+    MAHONY = "mahony"
+    MADGWICK = "madgwick"
+
+    RAD2DEG = 180.0 / math.pi
+
+    def __init__(self, algorithm=MAHONY, frequency=100.0, k_P=1.0, k_I=0.3, gain=0.041, capacity=64):
+        self.algorithm = algorithm
+        self.dt = 1.0 / frequency
+        self.k_P = k_P
+        self.k_I = k_I
+        self.gain = gain
+        self.q = (1.0, 0.0, 0.0, 0.0)
+        self.b = [0.0, 0.0, 0.0]  # Mahony gyro bias estimate
+        self.q_block = np.zeros((capacity, 4))
+        self.rpy_block = np.zeros((capacity, 3))
+
+    def configure(self, algorithm=None, k_P=None, k_I=None, gain=None, frequency=None):
+        # Can be called while another thread is running update_block(), it applies from the next sample
+        if algorithm is not None:
+            if algorithm not in (self.MAHONY, self.MADGWICK):
+                raise ValueError(f"Unknown attitude filter: {algorithm}")
+            self.algorithm = algorithm
+        if k_P is not None:
+            self.k_P = k_P
+        if k_I is not None:
+            self.k_I = k_I
+        if gain is not None:
+            self.gain = gain
+        if frequency is not None:
+            self.dt = 1.0 / frequency
+
+    def reset(self, q=(1.0, 0.0, 0.0, 0.0)):
+        self.q = tuple(q)
+        self.b = [0.0, 0.0, 0.0]
+
+    def get_rpy(self, in_deg=True):
+        return self.__q2rpy(*self.q, self.RAD2DEG if in_deg else 1.0)
+
+    def update(self, gyr, acc, mag=None, dt=None):
+        dt = self.dt if dt is None else dt
+        if self.algorithm == self.MADGWICK:
+            self.q = self.__madgwick(self.q, gyr, acc, mag, dt)
+        else:
+            self.q = self.__mahony(self.q, gyr, acc, mag, dt)
+        return self.q
+
+    def update_block(self, gyr, acc, mag=None, dt=None, in_deg=True):
+        # gyr, acc: N x 3 (arrays or lists), mag: N x 3, a single 3-vector held for the block, or None.
+        # dt: scalar period or N timestamps deltas. Returns (N x 4 quaternions, N x 3 angles) views,
+        # valid until the next call.
+        n = len(gyr)
+        if n > len(self.q_block):
+            self.q_block = np.zeros((n, 4))
+            self.rpy_block = np.zeros((n, 3))
+        gyr = gyr.tolist() if isinstance(gyr, np.ndarray) else gyr
+        acc = acc.tolist() if isinstance(acc, np.ndarray) else acc
+        mag = mag.tolist() if isinstance(mag, np.ndarray) else mag
+        held_mag = mag is None or not hasattr(mag[0], "__len__")
+        if dt is None:
+            dt = self.dt
+        dts = dt.tolist() if isinstance(dt, np.ndarray) else dt
+        scalar_dt = not hasattr(dts, "__len__")
+        step = self.__madgwick if self.algorithm == self.MADGWICK else self.__mahony
+        scale = self.RAD2DEG if in_deg else 1.0
+        q = self.q
+        q_block = self.q_block
+        rpy_block = self.rpy_block
+        for i in range(n):
+            q = step(q, gyr[i], acc[i], mag if held_mag else mag[i], dts if scalar_dt else dts[i])
+            q_block[i] = q
+            rpy_block[i] = self.__q2rpy(*q, scale)
+        self.q = q
+        return q_block[:n], rpy_block[:n]
+
+    @staticmethod
+    def __q2rpy(qw, qx, qy, qz, scale=1.0):
+        # Same convention as ahrs.common.orientation.q2rpy
+        roll = math.atan2(2.0*(qw*qx + qy*qz), 1.0 - 2.0*(qx*qx + qy*qy))
+        pitch = math.asin(max(-1.0, min(1.0, 2.0*(qw*qy - qz*qx))))
+        yaw = math.atan2(2.0*(qw*qz + qx*qy), 1.0 - 2.0*(qy*qy + qz*qz))
+        return roll*scale, pitch*scale, yaw*scale
+
+    def __mahony(self, q, gyr, acc, mag, dt):
+        gx, gy, gz = gyr
+        if not (gx or gy or gz):
+            return q
+        qw, qx, qy, qz = q
+        ax, ay, az = acc
+        a_norm = math.sqrt(ax*ax + ay*ay + az*az)
+        if a_norm > 0:
+            ax /= a_norm
+            ay /= a_norm
+            az /= a_norm
+            # Expected gravity direction in body frame (third row of R)
+            r20 = 2.0*(qx*qz - qw*qy)
+            r21 = 2.0*(qw*qx + qy*qz)
+            r22 = 1.0 - 2.0*(qx*qx + qy*qy)
+            ex = ay*r22 - az*r21
+            ey = az*r20 - ax*r22
+            ez = ax*r21 - ay*r20
+            if mag is not None:
+                mx, my, mz = mag
+                m_norm = math.sqrt(mx*mx + my*my + mz*mz)
+            else:
+                m_norm = 0.0
+            if m_norm > 0:
+                mx /= m_norm
+                my /= m_norm
+                mz /= m_norm
+                r00 = 1.0 - 2.0*(qy*qy + qz*qz)
+                r01 = 2.0*(qx*qy - qw*qz)
+                r02 = 2.0*(qx*qz + qw*qy)
+                r10 = 2.0*(qx*qy + qw*qz)
+                r11 = 1.0 - 2.0*(qx*qx + qz*qz)
+                r12 = 2.0*(qy*qz - qw*qx)
+                # Magnetic field in earth frame, projected on the horizontal north axis
+                hx = r00*mx + r01*my + r02*mz
+                hy = r10*mx + r11*my + r12*mz
+                hz = r20*mx + r21*my + r22*mz
+                bx = math.sqrt(hx*hx + hy*hy)
+                vx = r10*bx + r20*hz
+                vy = r11*bx + r21*hz
+                vz = r12*bx + r22*hz
+                v_norm = math.sqrt(vx*vx + vy*vy + vz*vz)
+                vx /= v_norm
+                vy /= v_norm
+                vz /= v_norm
+                ex += my*vz - mz*vy
+                ey += mz*vx - mx*vz
+                ez += mx*vy - my*vx
+            b = self.b
+            k_I = self.k_I * dt
+            k_P = self.k_P
+            b[0] -= k_I*ex
+            b[1] -= k_I*ey
+            b[2] -= k_I*ez
+            gx += k_P*ex - b[0]
+            gy += k_P*ey - b[1]
+            gz += k_P*ez - b[2]
+        return self.__normalize(qw + 0.5*(-qx*gx - qy*gy - qz*gz)*dt,
+                                qx + 0.5*(qw*gx + qy*gz - qz*gy)*dt,
+                                qy + 0.5*(qw*gy - qx*gz + qz*gx)*dt,
+                                qz + 0.5*(qw*gz + qx*gy - qy*gx)*dt)
+
+    def __madgwick(self, q, gyr, acc, mag, dt):
+        gx, gy, gz = gyr
+        if not (gx or gy or gz):
+            return q
+        qw, qx, qy, qz = q
+        dw = 0.5*(-qx*gx - qy*gy - qz*gz)
+        dx = 0.5*(qw*gx + qy*gz - qz*gy)
+        dy = 0.5*(qw*gy - qx*gz + qz*gx)
+        dz = 0.5*(qw*gz + qx*gy - qy*gx)
+        ax, ay, az = acc
+        a_norm = math.sqrt(ax*ax + ay*ay + az*az)
+        if a_norm > 0:
+            ax /= a_norm
+            ay /= a_norm
+            az /= a_norm
+            f0 = 2.0*(qx*qz - qw*qy) - ax
+            f1 = 2.0*(qw*qx + qy*qz) - ay
+            f2 = 2.0*(0.5 - qx*qx - qy*qy) - az
+            # Accelerometer part of J.T @ f
+            s0 = -2.0*qy*f0 + 2.0*qx*f1
+            s1 = 2.0*qz*f0 + 2.0*qw*f1 - 4.0*qx*f2
+            s2 = -2.0*qw*f0 + 2.0*qz*f1 - 4.0*qy*f2
+            s3 = 2.0*qx*f0 + 2.0*qy*f1
+            if mag is not None:
+                mx, my, mz = mag
+                m_norm = math.sqrt(mx*mx + my*my + mz*mz)
+            else:
+                m_norm = 0.0
+            if m_norm > 0:
+                mx /= m_norm
+                my /= m_norm
+                mz /= m_norm
+                # Earth frame reference field from the rotated measurement
+                hx = (1.0 - 2.0*(qy*qy + qz*qz))*mx + 2.0*(qx*qy - qw*qz)*my + 2.0*(qx*qz + qw*qy)*mz
+                hy = 2.0*(qx*qy + qw*qz)*mx + (1.0 - 2.0*(qx*qx + qz*qz))*my + 2.0*(qy*qz - qw*qx)*mz
+                bz = 2.0*(qx*qz - qw*qy)*mx + 2.0*(qw*qx + qy*qz)*my + (1.0 - 2.0*(qx*qx + qy*qy))*mz
+                bx = math.sqrt(hx*hx + hy*hy)
+                f3 = 2.0*bx*(0.5 - qy*qy - qz*qz) + 2.0*bz*(qx*qz - qw*qy) - mx
+                f4 = 2.0*bx*(qx*qy - qw*qz) + 2.0*bz*(qw*qx + qy*qz) - my
+                f5 = 2.0*bx*(qw*qy + qx*qz) + 2.0*bz*(0.5 - qx*qx - qy*qy) - mz
+                s0 += -2.0*bz*qy*f3 + (-2.0*bx*qz + 2.0*bz*qx)*f4 + 2.0*bx*qy*f5
+                s1 += 2.0*bz*qz*f3 + (2.0*bx*qy + 2.0*bz*qw)*f4 + (2.0*bx*qz - 4.0*bz*qx)*f5
+                s2 += (-4.0*bx*qy - 2.0*bz*qw)*f3 + (2.0*bx*qx + 2.0*bz*qz)*f4 + (2.0*bx*qw - 4.0*bz*qy)*f5
+                s3 += (-4.0*bx*qz + 2.0*bz*qx)*f3 + (-2.0*bx*qw + 2.0*bz*qy)*f4 + 2.0*bx*qx*f5
+            s_norm = math.sqrt(s0*s0 + s1*s1 + s2*s2 + s3*s3)
+            if s_norm > 0:
+                gain = self.gain / s_norm
+                dw -= gain*s0
+                dx -= gain*s1
+                dy -= gain*s2
+                dz -= gain*s3
+        return self.__normalize(qw + dw*dt, qx + dx*dt, qy + dy*dt, qz + dz*dt)
+
+    @staticmethod
+    def __normalize(qw, qx, qy, qz):
+        n = math.sqrt(qw*qw + qx*qx + qy*qy + qz*qz)
+        return qw/n, qx/n, qy/n, qz/n
@@ -0,0 +1,127 @@
+import threading
+import numpy as np
+
+
+class HistoryLevel:
+
+    # Ring of fixed-width time buckets holding min / max / sum / count for every signal.
+    # Bucket b covers [b*width, (b+1)*width) and lives in slot b % capacity, `ids` tells which
+    # bucket a slot currently holds so stale slots are ignored.
+
+    def __init__(self, width, capacity, n_signals):
+        self.width = width
+        self.capacity = capacity
+        self.ids = np.full(capacity, -1, dtype=np.int64)
+        self.min = np.zeros((capacity, n_signals))
+        self.max = np.zeros((capacity, n_signals))
+        self.sum = np.zeros((capacity, n_signals))
+        self.count = np.zeros(capacity, dtype=np.int64)
+
+    def add_block(self, t, values):
+        buckets = np.floor_divide(t, self.width).astype(np.int64)
+        # Runs of consecutive samples falling in the same bucket are reduced in one call each
+        starts = np.flatnonzero(np.diff(buckets)) + 1
+        starts = np.concatenate(([0], starts))
+        mins = np.minimum.reduceat(values, starts)
+        maxs = np.maximum.reduceat(values, starts)
+        sums = np.add.reduceat(values, starts)
+        counts = np.diff(np.append(starts, len(t)))
+        for i, start in enumerate(starts):
+            bucket = buckets[start]
+            slot = bucket % self.capacity
+            if self.ids[slot] != bucket:
+                self.ids[slot] = bucket
+                self.min[slot] = mins[i]
+                self.max[slot] = maxs[i]
+                self.sum[slot] = sums[i]
+                self.count[slot] = counts[i]
+            else:
+                np.minimum(self.min[slot], mins[i], out=self.min[slot])
+                np.maximum(self.max[slot], maxs[i], out=self.max[slot])
+                self.sum[slot] += sums[i]
+                self.count[slot] += counts[i]
+
+    def query(self, column, t_from, t_to, points=None):
+        # At most `points` rows: runs of `merge` adjacent buckets are reduced to one row
+        # (min of the mins, max of the maxes, count-weighted mean) when the range has more buckets
+        # t_from and t_to must be finite. Buckets outside the ids held by the level are never
+        # valid, so the range is clamped to them before the integer conversion.
+        newest = int(self.ids.max())
+        oldest = max(newest - self.capacity + 1, 0) * self.width
+        t_from = min(max(t_from, oldest), max(newest + 1, 0) * self.width)
+        t_to = min(max(t_to, oldest), max(newest + 1, 0) * self.width)
+        first = int(t_from // self.width)
+        last = int(t_to // self.width)
+        first = max(first, last - self.capacity + 1)
+        buckets = np.arange(first, last + 1, dtype=np.int64)
+        slots = buckets % self.capacity
+        valid = self.ids[slots] == buckets
+        buckets = buckets[valid]
+        slots = slots[valid]
+        merge = 1 if points is None else max(-(-(last - first + 1) // points), 1)
+        if merge == 1:
+            return {
+                "t": ((buckets + 0.5) * self.width).tolist(),
+                "min": self.min[slots, column].tolist(),
+                "max": self.max[slots, column].tolist(),
+                "mean": (self.sum[slots, column] / self.count[slots]).tolist(),
+                "bucket": self.width
+            }
+        groups = (buckets - first) // merge
+        starts = np.flatnonzero(np.diff(groups)) + 1
+        starts = np.concatenate(([0], starts))
+        if len(slots) == 0:
+            starts = starts[:0]
+        groups = groups[starts]
+        ends = np.minimum(first + (groups + 1) * merge, last + 1)
+        return {
+            "t": ((first + groups * merge + ends) * 0.5 * self.width).tolist(),
+            "min": np.minimum.reduceat(self.min[slots, column], starts).tolist(),
+            "max": np.maximum.reduceat(self.max[slots, column], starts).tolist(),
+            "mean": (np.add.reduceat(self.sum[slots, column], starts) /
+                     np.add.reduceat(self.count[slots], starts)).tolist(),
+            "bucket": self.width * merge
+        }
+
+
+class TelemetryHistory:
+
+    # Min/max/mean pyramids of a set of signals, updated incrementally as samples arrive.
+    # query() picks the finest level that answers a time range in at most `points` buckets, so the
+    # cost only depends on `points`, not on how many raw samples the range covers. Ranges too long
+    # for the coarsest level get its buckets merged down to `points` rows.
+
+    LEVELS = ((1.0, 3600),    # 1 s buckets, 1 hour
+              (10.0, 8640),   # 10 s buckets, 24 hours
+              (60.0, 10080))  # 1 min buckets, 7 days
+
+    def __init__(self, signals, levels=LEVELS):
+        self.signals = tuple(signals)
+        self.index = {name: i for i, name in enumerate(self.signals)}
+        self.levels = [HistoryLevel(width, capacity, len(self.signals)) for width, capacity in levels]
+        self.lock = threading.Lock()
+
+    def add(self, t, values):
+        self.add_block(np.array([t]), np.array([values], dtype=float))
+
+    def add_block(self, t, values):
+        # t: N timestamps (increasing), values: N x len(signals)
+        if len(t) == 0:
+            return
+        with self.lock:
+            for level in self.levels:
+                level.add_block(t, values)
+
+    def query(self, signal, t_from, t_to, points=500):
+        column = self.index[signal]
+        span = max(t_to - t_from, 0.0)
+        chosen = self.levels[-1]
+        for level in self.levels:
+            retained_from = t_to - level.width * level.capacity
+            if span / level.width <= points and t_from >= retained_from:
+                chosen = level
+                break
+        with self.lock:
+            result = chosen.query(column, t_from, t_to, points)
+        result["signal"] = signal
+        return result
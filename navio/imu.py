@@ -1,62 +1,193 @@
 import time
 import threading
-from navio.mpu9250 import MPU9250
 import numpy as np
-from ahrs.filters import Mahony
-from ahrs.common.orientation import q2rpy
+from navio.mpu9250 import MPU9250
+from navio.fusion import AttitudeFilter
+from navio.ringbuffer import SampleRing
+from navio.history import TelemetryHistory
+import navio.scheduler as navio_scheduler
+import navio.bus as navio_bus
+import navio.metrics as navio_metrics
 
 class IMUManager:
 
     __SAMPLE_RATE = 20.0  # IMU reading rate
     __DT = 1.0/__SAMPLE_RATE
     __BETA = 0.1
+    __FIFO_SAMPLE_RATE_DIV = 1  # 500 Hz sensor output in FIFO mode
+    __FIFO_POLL_RATE = 50.0  # FIFO drain rate, ~10 frames per block at 500 Hz
 
-    def __init__(self):
+    FIELDS = ("t", "ax", "ay", "az", "gx", "gy", "gz", "mx", "my", "mz",
+              "qw", "qx", "qy", "qz", "roll", "pitch", "yaw")
+
+    def __init__(self, fifo=False, algorithm=AttitudeFilter.MAHONY, ring_capacity=4096, cache=None, scheduler=None,
+                 interrupt_pin=None, samples=None):
+        # interrupt_pin: GPIO wired to the MPU9250 INT output, samples are then read at every data
+        # ready interrupt (without FIFO) instead of polled by the scheduler
+        # samples: ring to publish into (e.g. a navio.ringbuffer.SharedSampleRing), FIELDS columns
         
-        self.imu = MPU9250()
+        self.imu = MPU9250(cache=cache)
+        self.fifo = fifo
+        self.scheduler = scheduler or navio_scheduler.get_scheduler()
+        self.task = None
+        self.pin = None
         self.run = False
         self.t_update = None
+        self.t_interrupt = None
+        self.interrupts = 0
+        self.missed = 0  # samples produced by the sensor and never read
+        self.errors = 0
+        self.missed_metric = navio_metrics.counter(
+            "navio_imu_missed_samples_total", "IMU samples produced by the sensor and never read")
         self.m9a = [0.0, 0.0, 0.0]
         self.m9g = [0.0, 0.0, 0.0]
         self.m9m = [0.0, 0.0, 0.0]
-        self.mahony = Mahony(
-            gyr=np.array([self.m9a]),
-            acc=np.array([self.m9g]),
-            mag=np.array([self.m9m]),
-            frequency=self.__SAMPLE_RATE
-        )
-        self.q = np.array([1.0, 0.0, 0.0, 0.0])
+        self.ahrs = AttitudeFilter(algorithm, frequency=self.__SAMPLE_RATE, gain=self.__BETA)
+        self.q = self.ahrs.q
         self.att = [0.0, 0.0, 0.0]
-        self.t = time.time()
+        self.samples = samples if samples is not None else SampleRing(self.FIELDS, ring_capacity)
+        self.history = TelemetryHistory(self.FIELDS[1:])
+        self.recorder = None  # navio.recorder.Recorder with IMU_DTYPE records
+        self.updated = threading.Condition()
+        self.__block = np.zeros((MPU9250.FIFO_SIZE // MPU9250.FIFO_FRAME_SIZE, len(self.FIELDS)))
 
         if self.imu.testConnection():
             self.imu.initialize()
-            time.sleep(1)
+            if self.fifo:
+                self.imu.enable_fifo(self.__FIFO_SAMPLE_RATE_DIV)
+                self.ahrs.configure(frequency=1.0/self.imu.fifo_period)
+            elif interrupt_pin is not None:
+                self.pin = navio_bus.input_pin(interrupt_pin)
+                self.ahrs.configure(frequency=self.imu.set_sample_rate(self.__SAMPLE_RATE))
+                self.imu.enable_data_ready_interrupt()
         else: 
             print("Error: IMU Connection not established")
 
     def __update(self):
+        if self.fifo:
+            self.__update_fifo()
+        else:
+            self.__update_sample(time.time())
+
+    def __update_sample(self, t):
+        self.m9a, self.m9g, self.m9m = self.imu.getMotion9()
+        self.q = self.ahrs.update(self.m9g, self.m9a, self.m9m)
+        self.att = self.ahrs.get_rpy()
+        sample = (t, *self.m9a, *self.m9g, *self.m9m, *self.q, *self.att)
+        recorder = self.recorder  # cleared by /runrec from another thread
+        if recorder:
+            recorder.record((sample[0], sample[1:4], sample[4:7], sample[7:10], self.imu.temperature))
+        self.samples.append(sample)
+        self.history.add(sample[0], sample[1:])
+        self.__notify()
+
+    def __run_interrupt(self):
+        # One sample per data ready interrupt, timestamped at the interrupt. Edges collected
+        # together, or periods without any edge, are samples the sensor produced and we never read.
+        period = self.imu.sample_period
         while self.run:
-            self.m9a, self.m9g, self.m9m = self.imu.getMotion9()
-            self.q = self.mahony.updateMARG(self.q, np.array(self.m9g), np.array(self.m9a), np.array(self.m9m))
-            self.att = q2rpy(self.q, in_deg=True)
-            dt = time.time()-self.t
-            self.t = time.time()
-            time.sleep(max(self.__DT-dt, 0))
+            edge = self.pin.wait_edge(0.1)
+            if edge is None:
+                continue
+            t, edges = edge
+            if self.t_interrupt is not None:
+                missed = max(edges, int(round((t - self.t_interrupt) / period))) - 1
+                if missed > 0:
+                    self.missed += missed
+                    self.missed_metric.inc(missed)
+            self.t_interrupt = t
+            self.interrupts += 1
+            try:
+                self.__update_sample(t)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error: IMU read failed ({type(e).__name__}: {e})")
+
+    def __update_fifo(self):
+        t, acc, gyro, temp = self.imu.read_fifo()
+        if len(t):
+            # The FIFO only holds accel/temp/gyro, the latest magnetometer sample is held for the block
+            self.imu.read_all()
+            q, rpy = self.ahrs.update_block(gyro, acc, self.imu.magnetometer_data, self.imu.fifo_period)
+            self.m9a = acc[-1].tolist()
+            self.m9g = gyro[-1].tolist()
+            self.m9m = self.imu.magnetometer_data
+            self.q = self.ahrs.q
+            self.att = rpy[-1].tolist()
+            n = len(t)
+            block = self.__block[:n]
+            block[:, 0] = t
+            block[:, 1:4] = acc
+            block[:, 4:7] = gyro
+            block[:, 7:10] = self.m9m
+            block[:, 10:14] = q
+            block[:, 14:17] = rpy
+            self.samples.extend(block)
+            self.history.add_block(block[:, 0], block[:, 1:])
+            recorder = self.recorder
+            if recorder:
+                recorder.record_block(t=t, acc=acc, gyro=gyro, mag=self.m9m, temp=temp)
+            self.__notify()
+
+    def __notify(self):
+        with self.updated:
+            self.updated.notify_all()
+
+    def wait_update(self, timeout=None):
+        with self.updated:
+            return self.updated.wait(timeout)
+
+    def set_filter(self, algorithm=None, **gains):
+        # algorithm: AttitudeFilter.MAHONY or AttitudeFilter.MADGWICK, gains: k_P, k_I (Mahony), gain (Madgwick)
+        self.ahrs.configure(algorithm, **gains)
 
     def get_data(self):
-        return (self.m9a, self.m9g, self.m9m, self.att)
+        # Consistent copy of the latest sample as (acc, gyro, mag, roll/pitch/yaw) lists
+        sample = self.samples.latest()
+        if sample is None:
+            return ([0.0, 0.0, 0.0], [0.0, 0.0, 0.0], [0.0, 0.0, 0.0], [0.0, 0.0, 0.0])
+        return (sample[1:4].tolist(), sample[4:7].tolist(), sample[7:10].tolist(), sample[14:17].tolist())
+
+    def latest(self):
+        return self.samples.latest()
+
+    def window(self, n, copy=False):
+        return self.samples.window(n, copy)
+
+    def since(self, t, copy=False):
+        return self.samples.since(t, copy)
+
+    def stats(self):
+        return {
+            "mode": "fifo" if self.fifo else "interrupt" if self.pin else "poll",
+            "interrupts": self.interrupts,
+            "missed": self.missed,
+            "errors": self.errors,
+            "fifo_overflows": self.imu.fifo_overflows,
+            "fifo_resyncs": self.imu.fifo_resyncs,
+        }
 
     def start(self):
-        if not self.t_update:
-            self.run = True
-            self.t_update = threading.Thread(target=self.__update)
-            self.t_update.start()
+        if self.pin:
+            if not self.run:
+                self.run = True
+                self.t_interrupt = None
+                self.t_update = threading.Thread(target=self.__run_interrupt, name="imu", daemon=True)
+                self.t_update.start()
+        elif not self.task:
+            period = 1.0/self.__FIFO_POLL_RATE if self.fifo else self.__DT
+            self.task = self.scheduler.add("imu", self.__update, period, self.scheduler.HIGH)
 
     def shutdown(self):
+        if self.run:
+            self.run = False
+            self.t_update.join()
+            self.imu.disable_interrupts()
+        if self.pin:
+            self.pin.close()
+            self.pin = None
+        if self.task:
+            self.scheduler.remove(self.task)
+            self.task = None
         if self.imu.bus:
             self.imu.bus.close()
-        self.run = False
-        if self.t_update:
-            self.t_update.join()
-            self.t_update = None
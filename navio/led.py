@@ -1,162 +1,313 @@
+import os
+import math
 import time
+import json
+import socket
 import threading
 import navio.pwm as navio_pwm
+import navio.scheduler as navio_scheduler
+import navio.animation as navio_animation
 
 class NavioLED:
 
+    # Plays precompiled navio.animation patterns from one scheduler task: each run writes the
+    # channels changed by the current table entry and returns the deadline of the next entry.
+    # Switching patterns only replaces the animation, the task picks it up at its next run.
+
     R_CHANNEL = 2
     G_CHANNEL = 1
     B_CHANNEL = 0
+    CHANNELS = (R_CHANNEL, G_CHANNEL, B_CHANNEL)
 
-    RED = (1, 0, 0)
-    GREEN = (0, 1, 0)
-    BLUE = (0, 0, 1)
-    YELLOW = (1, 1, 0)
-    PURPLE = (1, 0, 1)
-    CYAN = (0, 1, 1)
+    RED = navio_animation.RED
+    GREEN = navio_animation.GREEN
+    BLUE = navio_animation.BLUE
+    YELLOW = navio_animation.YELLOW
+    PURPLE = navio_animation.PURPLE
+    CYAN = navio_animation.CYAN
 
-    def __init__(self, color=(1.0, 1.0, 1.0), saturation=1.0):
+    def __init__(self, color=(1.0, 1.0, 1.0), saturation=1.0, scheduler=None):
         self.pwm = navio_pwm.NavioPWM()
         self.color = color
         self.saturation = saturation
-        self.run = True
-        self.t_update = None
-        self.pulse_run = False
-        self.t_pulse = None
+        self.scheduler = scheduler or navio_scheduler.get_scheduler()
+        self.task_update = None
+        self.pattern = ("solid", {})
+        self.animation = self.__compile()
+        self.playing = None  # animation the task is playing
+        self.index = 0
+        self.t_next = 0.0
+
+    def __compile(self):
+        name, params = self.pattern
+        return navio_animation.compile_pattern(name, self.color, self.CHANNELS, self.saturation, **params)
 
     def __update(self):
-        while self.run:
-            self.pwm.set_pwm(self.R_CHANNEL, 1 - self.color[0] * self.saturation)
-            self.pwm.set_pwm(self.G_CHANNEL, 1 - self.color[1] * self.saturation)
-            self.pwm.set_pwm(self.B_CHANNEL, 1 - self.color[2] * self.saturation)
-            time.sleep(0.01)
+        animation = self.animation
+        now = time.monotonic()
+        if animation is not self.playing:
+            self.playing = animation
+            self.index = 0
+            self.t_next = now
+            changes = animation.first
+        else:
+            self.index += 1
+            if self.index >= len(animation):
+                if not animation.loop:
+                    return math.inf
+                self.index = 0
+            changes = animation.entries[self.index][0]
+        if changes:
+            self.pwm.set_channels(changes)
+        if len(animation) == 1:
+            return math.inf
+        # Absolute deadlines so the pattern does not drift, restarting from now after a late run
+        self.t_next = max(self.t_next + animation.entries[self.index][1], now)
+        return self.t_next
+
+    def __changed(self):
+        self.animation = self.__compile()
+        if self.task_update:
+            self.scheduler.trigger(self.task_update)
+
+    def show(self, name, **params):
+        # name: navio.animation pattern ("solid", "breathe", "blink", "heartbeat", "cycle", "status-ok"...)
+        self.pattern = (name, params)
+        self.__changed()
 
     def set_color(self, color=(1.0, 1.0, 1.0)):
-        self.color = color
+        if color != self.color:
+            self.color = color
+            self.__changed()
 
     def set_saturation(self, saturation=1.0):
-        self.saturation = saturation
+        if saturation != self.saturation:
+            self.saturation = saturation
+            self.__changed()
 
     def on(self):
-        if self.t_pulse:
-            self.pulse_run = False
-            self.t_pulse.join()
-            self.t_pulse = None
-        self.set_saturation(1)
+        self.saturation = 1.0
+        self.show("solid")
 
     def off(self):
-        if self.t_pulse:
-            self.pulse_run = False
-            self.t_pulse.join()
-            self.t_pulse = None
-        self.set_saturation(0)
-
-    def __pulse_manager(self, on=0.0, off=0.0, fade_in=1.0, fade_out=0.5, cycles=0):
-        i = 0
-        step = 0.01
-        on_steps = int(on / step)
-        off_steps = int(off / step)
-        fade_in_steps = int(fade_in / step)
-        fade_out_steps = int(fade_out / step)
-        while self.pulse_run and (cycles == 0 or i < cycles):
-            self.set_saturation(0)
-            s = 0
-            while self.pulse_run:
-                if off_steps < s < off_steps + fade_in_steps:
-                    self.set_saturation((s - off_steps) / (fade_in_steps - 1))
-                elif off_steps + fade_in_steps + on_steps < s < off_steps + fade_in_steps + on_steps + fade_out_steps:
-                    self.set_saturation(1 - (s - off_steps - fade_in_steps - on_steps) / (fade_out_steps - 1))
-                elif s >= off_steps + fade_in_steps + on_steps + fade_out_steps:
-                    break
-                s += 1
-                time.sleep(step)
-            i += 1
-        self.pulse_run = False
-        self.set_saturation(1)
-
-    def pulse(self):
-        if not self.t_pulse:
-            self.pulse_run = True
-            self.t_pulse = threading.Thread(target=self.__pulse_manager)
-            self.t_pulse.start()
+        self.saturation = 0.0
+        self.show("solid")
+
+    def pulse(self, **params):
+        self.saturation = 1.0
+        self.show("breathe", **params)
+
+    def blink(self, **params):
+        self.saturation = 1.0
+        self.show("blink", **params)
+
+    def cycle(self, **params):
+        self.saturation = 1.0
+        self.show("cycle", **params)
+
+    def status(self, name):
+        # name: a navio.animation.STATUS pattern
+        self.saturation = 1.0
+        self.show("status-" + name)
 
     def start(self):
         self.pwm.start()
-        if not self.t_update:
-            self.run = True
-            self.t_update = threading.Thread(target=self.__update)
-            self.t_update.start()
+        self.playing = None  # every output is off after pwm.start(), rewrite all channels
+        if not self.task_update:
+            self.task_update = self.scheduler.add("led", self.__update, None, self.scheduler.LOW)
+        self.scheduler.trigger(self.task_update)
 
     def shutdown(self):
         self.off()
-        if self.t_update:
-            self.run = False
-            self.t_update.join()
-            self.t_update = None
+        if self.task_update:
+            self.scheduler.remove(self.task_update)
+            self.task_update = None
         self.pwm.shutdown()
+        self.playing = None
+
+
+def parse_conf(mode, color):
+    # (mode, (red, green, blue)) as int and floats, raises ValueError for a non numeric mode or color
+    mode = int(mode)
+    rgb = tuple(float(c) for c in color)
+    if len(rgb) != 3:
+        raise ValueError(f"Expected 3 color components, got {len(rgb)}")
+    return mode, rgb
 
 
 class NavioLEDManager:
 
-    CONF_LED_PATH = "/tmp/rpi-navioweb_conf_led"
-    CONF_LED_STATUS_PATH = "/tmp/rpi-navioweb_conf_led_status"
+    # LED configuration applied as soon as it is received, either in-process with configure() or
+    # from other processes as "mode,red,green,blue" datagrams on a Unix socket (answered with the
+    # status as JSON when the sender has an address, "status" only asks for it). A "#<id> " prefix
+    # on a request is echoed on its reply. Nothing is polled.
+
+    CONF_LED_SOCKET = "/tmp/rpi-navioweb_led.sock"
 
-    def __init__(self):
-        self.led = NavioLED()
+    MODES = {1: "off", 2: "on", 3: "pulse", 4: "blink", 5: "cycle",
+             6: "status-ok", 7: "status-busy", 8: "status-warning", 9: "status-error"}  # any other mode: "sleep"
+
+    def __init__(self, scheduler=None, socket_path=CONF_LED_SOCKET):
+        self.scheduler = scheduler or navio_scheduler.get_scheduler()
+        self.led = NavioLED(scheduler=self.scheduler)
         self.run = False
-        self.t_update = None
+        self.lock = threading.Lock()
         self.mode = 2
         self.rgb = self.led.GREEN
-        with open(self.CONF_LED_PATH, 'w+') as f:
-            f.write("{},{},{},{}".format(self.mode, *self.rgb))
+        self.status = "stopped"
+        self.socket_path = socket_path
+        self.socket = None
+        self.t_socket = None
 
-    def load_conf(self):
-        with open(self.CONF_LED_PATH, 'r') as f:
-            conf_led = f.read().split(',')
-        try:
-            mode = int(conf_led[0])
-            rgb = tuple(map(float, conf_led[1:4]))
-        except ValueError:
-            pass
+    def __apply(self):
+        self.led.set_color(self.rgb)
+        if self.mode == 1:
+            self.led.off()
+        elif self.mode == 2:
+            self.led.on()
+        elif self.mode == 3:
+            self.led.pulse()
+        elif self.mode == 4:
+            self.led.blink()
+        elif self.mode == 5:
+            self.led.cycle()
+        elif self.mode in self.MODES:
+            self.led.status(self.MODES[self.mode][len("status-"):])
         else:
-            self.led.set_color(rgb)
-            if mode == 1:
-                self.led.off()
-                status = "off"
-            elif mode == 2:
-                self.led.on()
-                status = "on"
-            elif mode == 3:
-                self.led.pulse()
-                status = "pulse"
-            else:
-                self.run = False
-                status = "sleep"
-            if mode != self.mode or rgb != self.rgb:
-                with open(self.CONF_LED_STATUS_PATH, 'w+') as fout:
-                    fout.write(status)
-                self.mode = mode
-                self.rgb = rgb
+            # "sleep" stops applying configurations until the next shutdown/start
+            self.run = False
+        self.status = self.MODES.get(self.mode, "sleep")
+
+    def configure(self, mode=0, color=(0.0, 0.0, 0.0)):
+        # Raises ValueError for a non numeric mode or color
+        mode, rgb = parse_conf(mode, color)
+        with self.lock:
+            self.mode = mode
+            self.rgb = rgb
+            if self.run:
+                self.__apply()
 
     def write_conf(self, mode=0, color=(0.0, 0.0, 0.0)):
-        with open(self.CONF_LED_PATH, 'w') as f:
-            f.write("{},{},{},{}".format(mode, *color))
+        try:
+            self.configure(mode, color)
+        except (TypeError, ValueError):
+            pass  # invalid configurations were ignored by the file based channel as well
 
-    def __update(self):
-        while self.run:
-            self.load_conf()
-            time.sleep(0.025)
+    def get_status(self):
+        with self.lock:
+            return {"running": self.run, "status": self.status, "mode": self.mode, "color": list(self.rgb),
+                    "saturation": self.led.saturation}
+
+    def __serve_socket(self, sock):
+        while self.socket is sock:
+            try:
+                message, address = sock.recvfrom(256)
+            except OSError:
+                break
+            if self.socket is not sock:
+                break
+            prefix = b""
+            if message.startswith(b"#"):
+                prefix, _, message = message.partition(b" ")
+                prefix += b" "
+            # "status" only asks for the reply, anything else is a "mode,r,g,b" configuration
+            if message != b"status":
+                try:
+                    values = message.decode().split(',')
+                    self.configure(values[0], values[1:4])
+                except (UnicodeDecodeError, TypeError, ValueError):
+                    pass
+            if address:
+                try:
+                    sock.sendto(prefix + json.dumps(self.get_status()).encode(), address)
+                except OSError:
+                    pass
+
+    def __open_socket(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.bind(self.socket_path)
+        self.t_socket = threading.Thread(target=self.__serve_socket, args=(self.socket,), daemon=True)
+        self.t_socket.start()
+
+    def __close_socket(self):
+        sock, self.socket = self.socket, None
+        if sock:
+            # Wake the receiving thread up with an empty datagram
+            with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as wake:
+                wake.sendto(b"", self.socket_path)
+            self.t_socket.join()
+            self.t_socket = None
+            sock.close()
+            os.unlink(self.socket_path)
 
     def start(self):
-        if not self.t_update:
+        if not self.run:
             self.led.start()
-            self.run = True
-            self.t_update = threading.Thread(target=self.__update)
-            self.t_update.start()
+            with self.lock:
+                self.run = True
+                self.__apply()
+            if self.socket_path and not self.socket:
+                self.__open_socket()
 
     def shutdown(self):
-        self.run = False
-        if self.t_update:
-            self.t_update.join()
-            self.t_update = None
+        with self.lock:
+            self.run = False
+            self.status = "stopped"
+        self.__close_socket()
         self.led.shutdown()
+
+
+class NavioLEDClient:
+
+    # NavioLEDManager interface for another process: configurations are sent to the manager's
+    # socket and answered with its status. start() and shutdown() switch the LED back to the last
+    # configuration and off, the manager itself keeps running in its process. close() releases the
+    # client without touching the LED, for the teardown of the client process.
+    # Requests carry an id echoed by the manager: a reply arriving after its request timed out is
+    # discarded instead of being taken for the answer to the next one.
+
+    TIMEOUT = 1.0
+
+    def __init__(self, socket_path=NavioLEDManager.CONF_LED_SOCKET):
+        self.socket_path = socket_path
+        self.lock = threading.Lock()
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.bind(f"\0navio-led-client-{os.getpid()}-{id(self)}")  # abstract address for the replies
+        self.conf = None
+        self.request_id = 0
+
+    def __request(self, message):
+        # Raises OSError when the manager does not answer within TIMEOUT
+        with self.lock:
+            self.request_id += 1
+            prefix = f"#{self.request_id} ".encode()
+            self.socket.sendto(prefix + message, self.socket_path)
+            t_end = time.monotonic() + self.TIMEOUT
+            while True:
+                self.socket.settimeout(max(t_end - time.monotonic(), 0.001))
+                reply = self.socket.recv(4096)
+                if reply.startswith(prefix):
+                    return json.loads(reply[len(prefix):])
+
+    def configure(self, mode=0, color=(0.0, 0.0, 0.0)):
+        mode, rgb = parse_conf(mode, color)
+        self.conf = (mode, rgb)
+        return self.__request(f"{mode},{rgb[0]},{rgb[1]},{rgb[2]}".encode())
+
+    def get_status(self):
+        return self.__request(b"status")
+
+    def start(self):
+        if self.conf:
+            self.configure(*self.conf)
+
+    def shutdown(self):
+        conf = self.conf
+        self.configure(1, conf[1] if conf else (0.0, 0.0, 0.0))
+        self.conf = conf
+
+    def close(self):
+        with self.lock:
+            self.socket.close()
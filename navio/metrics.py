@@ -0,0 +1,127 @@
+import math
+import bisect
+import threading
+
+
+# Minimal Prometheus instrumentation: counters and histograms updated in place by the single
+# thread that owns them (no lock on the hot path, the scrape may see a sample in flight), and
+# callback metrics read only when /metrics is scraped. render() produces the text exposition
+# format (version 0.0.4).
+
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class Counter:
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Callback:
+
+    def __init__(self, function):
+        self.function = function
+
+    def samples(self, name, labels):
+        yield name, labels, self.function()
+
+
+class Histogram:
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name, labels):
+        counts = list(self.counts)
+        total = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            total += count
+            yield name + "_bucket", labels + (("le", format_value(bound)),), total
+        yield name + "_sum", labels, self.sum
+        yield name + "_count", labels, total
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value)) if value else "0"
+    return repr(value)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+class Registry:
+
+    def __init__(self):
+        self.families = {}  # name -> (type, help, {labels: metric})
+        self.lock = threading.Lock()
+
+    def get(self, name, kind, help, labels, factory):
+        # Same name and labels return the same metric, so re-created drivers keep their series
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            family = self.families.setdefault(name, (kind, help, {}))
+            if family[0] != kind:
+                raise ValueError(f"Metric {name} already registered as a {family[0]}")
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = factory()
+            return metric
+
+    def set(self, name, kind, help, labels, metric):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.families.setdefault(name, (kind, help, {}))[2][key] = metric
+        return metric
+
+    def render(self):
+        lines = []
+        with self.lock:
+            families = [(name, kind, help, list(children.items()))
+                        for name, (kind, help, children) in sorted(self.families.items())]
+        for name, kind, help, children in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in children:
+                for sample, sample_labels, value in metric.samples(name, labels):
+                    lines.append(f"{sample}{format_labels(sample_labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help, **labels):
+    return REGISTRY.get(name, "counter", help, labels, Counter)
+
+
+def histogram(name, help, buckets=BUCKETS, **labels):
+    return REGISTRY.get(name, "histogram", help, labels, lambda: Histogram(buckets))
+
+
+def gauge_callback(name, help, function, **labels):
+    # Replaces a previous callback with the same labels (e.g. a restarted stream)
+    return REGISTRY.set(name, "gauge", help, labels, Callback(function))
+
+
+def counter_callback(name, help, function, **labels):
+    return REGISTRY.set(name, "counter", help, labels, Callback(function))
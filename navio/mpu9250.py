@@ -1,7 +1,84 @@
-import spidev
 import time
 import struct
 import array
+import numpy as np
+import navio.bus as navio_bus
+import navio.metrics as navio_metrics
+
+
+class MPU9250Decoder:
+
+    # Converts raw MPU9250 register dumps into scaled values in a single pass.
+    # Scale factors are folded in once by set_scales() and every buffer is preallocated,
+    # so decoding a sample or a FIFO block does not build any intermediate list.
+
+    TEMP_SCALE = 1/340.0
+    TEMP_OFFSET = 36.53
+
+    __SENSORS = struct.Struct(">7h")  # ACCEL_XOUT_H..GYRO_ZOUT_L, big-endian
+    __VECTOR = struct.Struct(">3h")   # ACCEL or GYRO block alone
+    __MAG = struct.Struct("<3h")      # EXT_SENS_DATA: AK8963 HXL..HZH, little-endian
+    __FIFO_DTYPE = np.dtype(">i2")
+
+    def __init__(self, fifo_frames = 36, frame_words = 7):
+        self.acc_scale = 0.0
+        self.gyro_scale = 0.0
+        self.mag_scale = [0.0, 0.0, 0.0]
+        self.raw = bytearray(22)
+        self.frame_words = frame_words
+        self.fifo_raw = bytearray(fifo_frames * frame_words * 2)
+        self.fifo_scale = np.zeros(frame_words)
+        self.fifo_offset = np.zeros(frame_words)
+        self.fifo_out = np.zeros((fifo_frames, frame_words))
+
+    def set_scales(self, acc_scale, gyro_scale, mag_scale):
+        self.acc_scale = acc_scale
+        self.gyro_scale = gyro_scale
+        self.mag_scale[:] = mag_scale
+        self.fifo_scale[0:3] = acc_scale
+        self.fifo_scale[3] = self.TEMP_SCALE
+        self.fifo_scale[4:7] = gyro_scale
+        self.fifo_offset[3] = self.TEMP_OFFSET
+
+    def decode_all(self, response, acc, gyro, mag, mag_offset = 14):
+        # response: bytes read from ACCEL_XOUT_H with the AK8963 HXL..HZH at mag_offset, results
+        # written in place (mag is left untouched when None), returns temperature
+        self.raw[:len(response)] = response
+        ax, ay, az, t, gx, gy, gz = self.__SENSORS.unpack_from(self.raw, 0)
+        acc_scale = self.acc_scale
+        gyro_scale = self.gyro_scale
+        mag_scale = self.mag_scale
+        acc[0] = ax * acc_scale
+        acc[1] = ay * acc_scale
+        acc[2] = az * acc_scale
+        gyro[0] = gx * gyro_scale
+        gyro[1] = gy * gyro_scale
+        gyro[2] = gz * gyro_scale
+        if mag is not None:
+            mx, my, mz = self.__MAG.unpack_from(self.raw, mag_offset)
+            mag[0] = mx * mag_scale[0]
+            mag[1] = my * mag_scale[1]
+            mag[2] = mz * mag_scale[2]
+        return t * self.TEMP_SCALE + self.TEMP_OFFSET
+
+    def decode_vector(self, response, out, scale):
+        self.raw[:len(response)] = response
+        x, y, z = self.__VECTOR.unpack_from(self.raw, 0)
+        out[0] = x * scale
+        out[1] = y * scale
+        out[2] = z * scale
+
+    def decode_fifo(self, response, frames):
+        # Returns a (frames, 7) view of scaled [ax, ay, az, temp, gx, gy, gz] rows.
+        # The view is overwritten by the next call.
+        self.fifo_raw[:len(response)] = response
+        raw = np.frombuffer(self.fifo_raw, dtype=self.__FIFO_DTYPE,
+                            count=frames * self.frame_words).reshape(frames, self.frame_words)
+        out = self.fifo_out[:frames]
+        np.multiply(raw, self.fifo_scale, out=out)
+        out += self.fifo_offset
+        return out
+
 
 class MPU9250:
 
@@ -61,6 +138,7 @@ class MPU9250:
     __MPUREG_I2C_MST_STATUS     = 0x36
     __MPUREG_INT_PIN_CFG        = 0x37
     __MPUREG_INT_ENABLE         = 0x38
+    __MPUREG_INT_STATUS         = 0x3A
     __MPUREG_ACCEL_XOUT_H       = 0x3B
     __MPUREG_ACCEL_XOUT_L       = 0x3C
     __MPUREG_ACCEL_YOUT_H       = 0x3D
@@ -181,7 +259,29 @@ class MPU9250:
     __BITS_DLPF_CFG_MASK          = 0x07
     __BIT_INT_ANYRD_2CLEAR        = 0x10
     __BIT_RAW_RDY_EN              = 0x01
+    __BIT_I2C_SLV0_DLY_EN         = 0x01
+    __BIT_I2C_SLV0_EN             = 0x80
+    __BIT_AK8963_DRDY             = 0x01
+    __BIT_AK8963_DOR              = 0x02
+    __BIT_AK8963_HOFL             = 0x08
     __BIT_I2C_IF_DIS              = 0x10
+    __BIT_FIFO_OFLOW_INT          = 0x10
+    __BIT_FIFO_EN                 = 0x40
+    __BIT_FIFO_RST                = 0x04
+    __BIT_I2C_MST_EN              = 0x20
+    __BIT_TEMP_FIFO_EN            = 0x80
+    __BIT_XG_FIFO_EN              = 0x40
+    __BIT_YG_FIFO_EN              = 0x20
+    __BIT_ZG_FIFO_EN              = 0x10
+    __BIT_ACCEL_FIFO_EN           = 0x08
+
+    # FIFO frame: accel (6) + temp (2) + gyro (6), same layout as ACCEL_XOUT_H..GYRO_ZOUT_L
+    FIFO_FRAME_SIZE               = 14
+    FIFO_SIZE                     = 512
+    __FIFO_INTERNAL_RATE          = 1000.0 # Hz, with DLPF enabled
+    MAG_RATE                      = 100.0  # Hz, AK8963 continuous measurement mode 2
+    __MAG_BLOCK                   = 8      # ST1, HXL..HZH, ST2 mirrored in EXT_SENS_DATA_00..07
+    __SAMPLE_SIZE                 = 22     # ACCEL_XOUT_H..EXT_SENS_DATA_07
 
     __READ_FLAG                   = 0x80
 
@@ -203,21 +303,49 @@ class MPU9250:
 
     __Magnetometer_Sensitivity_Scale_Factor = 0.15
 
-    def __init__(self, spi_bus_number = 0, spi_dev_number = 1):
-        self.bus = spidev.SpiDev()
+    SPI_CONFIG_HZ = 1000000   # every register
+    SPI_DATA_HZ = 20000000    # sensor and interrupt registers only
+    FIFO_RESYNC = 0.01        # s, FIFO timestamp drift from the read time before re-anchoring
+
+    def __init__(self, spi_bus_number = 0, spi_dev_number = 1, cache = None, data_speed_hz = SPI_DATA_HZ):
         self.spi_bus_number = spi_bus_number
         self.spi_dev_number = spi_dev_number
-        self.bus.open(self.spi_bus_number, self.spi_dev_number)
-        self.bus.max_speed_hz = 1000000  # Vitesse max à 1 MHz (sûr pour tous les registres)
+        self.bus = navio_bus.open_spi(self.spi_bus_number, self.spi_dev_number)
+        self.bus.max_speed_hz = self.SPI_CONFIG_HZ  # Vitesse max à 1 MHz (sûr pour tous les registres)
+        self.data_speed_hz = data_speed_hz  # burst reads of the data registers, per transfer
         self.bus.mode = 0b00             # Mode SPI 0 (CPOL=0, CPHA=0) pour le MPU9250
         self.gyro_divider = 0.0
         self.acc_divider = 0.0
         self.calib_data = [0.0, 0.0, 0.0]
         self.magnetometer_ASA = [0.0, 0.0, 0.0]
+        self.cache = cache # navio.calibration.CalibrationCache for the AK8963 sensitivity adjustment
         self.temperature = 0.0
         self.gyroscope_data = [0.0, 0.0, 0.0]
         self.accelerometer_data = [0.0, 0.0, 0.0]
         self.magnetometer_data = [0.0, 0.0, 0.0]
+        self.mag_fresh = False     # ST1 DRDY on a block not seen by the previous read: new measurement
+        self.mag_overrun = False   # ST1 DOR: measurements were skipped since the previous one
+        self.mag_overflow = False  # ST2 HOFL: magnetic sensor overflow, magnetometer_data kept
+        self.mag_rate = 0.0        # rate of the AK8963 auto-read, 0 when not enabled
+        self.__mag_block = None
+        self.sample_rate_div = 0
+        self.sample_period = 1.0 / self.__FIFO_INTERNAL_RATE
+        self.fifo_enabled = False
+        self.fifo_period = 0.0
+        self.fifo_overflows = 0
+        self.fifo_resyncs = 0
+        self.__fifo_next = None  # timestamp of the next frame to be read, None until anchored
+        self.decoder = MPU9250Decoder(self.FIFO_SIZE // self.FIFO_FRAME_SIZE, self.FIFO_FRAME_SIZE // 2)
+        self.__fifo_t = np.zeros(self.FIFO_SIZE // self.FIFO_FRAME_SIZE)
+        self.__fifo_age = np.arange(self.FIFO_SIZE // self.FIFO_FRAME_SIZE - 1, -1, -1, dtype=float)
+        self.__transfers = {}
+        self.__read_metric = navio_metrics.histogram("navio_spi_transaction_seconds", "Latency of SPI transactions",
+                                                     device="mpu9250", op="read")
+        self.__data_read_metric = navio_metrics.histogram("navio_spi_transaction_seconds",
+                                                          "Latency of SPI transactions", device="mpu9250",
+                                                          op="read_data")
+        self.__write_metric = navio_metrics.histogram("navio_spi_transaction_seconds", "Latency of SPI transactions",
+                                                      device="mpu9250", op="write")
 
 # -----------------------------------------------------------------------------------------------
 #                                     REGISTER READ & WRITE
@@ -225,22 +353,42 @@ class MPU9250:
 # -----------------------------------------------------------------------------------------------
 
     def WriteReg(self, reg_address, data):
-        return self.bus.xfer2([reg_address, data])
+        t = time.perf_counter()
+        rx = self.bus.xfer2(bytes((reg_address, data)), self.SPI_CONFIG_HZ)
+        self.__write_metric.observe(time.perf_counter() - t)
+        return rx
 
 # -----------------------------------------------------------------------------------------------
 
     def ReadReg(self, reg_address):
-        rx = self.bus.xfer2([reg_address | self.__READ_FLAG, 0x00])
-        return rx[1]
+        return self.ReadRegs(reg_address, 1)[0]
 
 # -----------------------------------------------------------------------------------------------
 
+    def __is_data_register(self, reg_address, length):
+        # INT_STATUS to EXT_SENS_DATA_23, FIFO_COUNTH/L and FIFO_R_W accept the high SPI clock
+        last = reg_address + length - 1
+        return (self.__MPUREG_INT_STATUS <= reg_address and last <= self.__MPUREG_EXT_SENS_DATA_23 or
+                self.__MPUREG_FIFO_COUNTH <= reg_address and last <= self.__MPUREG_FIFO_R_W or
+                reg_address == self.__MPUREG_FIFO_R_W)
+
     def ReadRegs(self, reg_address, length):
-        tx = [0] * (length + 1)
-        tx[0] = reg_address | self.__READ_FLAG
-        rx = self.bus.xfer2(tx)
+        # The transmit buffer, clock and latency histogram are chosen once per (register, length):
+        # data registers are read at data_speed_hz, the others at the 1 MHz configuration clock
+        transfer = self.__transfers.get((reg_address, length))
+        if transfer is None:
+            tx = bytes((reg_address | self.__READ_FLAG,)) + bytes(length)
+            if self.__is_data_register(reg_address, length):
+                transfer = (tx, self.data_speed_hz, self.__data_read_metric)
+            else:
+                transfer = (tx, self.SPI_CONFIG_HZ, self.__read_metric)
+            self.__transfers[(reg_address, length)] = transfer
+        tx, speed_hz, metric = transfer
+        t = time.perf_counter()
+        rx = self.bus.xfer2(tx, speed_hz)
+        metric.observe(time.perf_counter() - t)
         # Retourne les octets de données (sans l'octet de commande)
-        return rx[1:len(rx)]
+        return rx[1:]
 
 # -----------------------------------------------------------------------------------------------
 #                                 TEST CONNECTION
@@ -261,36 +409,40 @@ class MPU9250:
     def initialize(self, sample_rate_div = 1, low_pass_filter = 0x01):
         MPU_InitRegNum = 17
 
+        # [value, register, delay]: only the device reset and the writes relayed to the AK8963 by the
+        # I2C master (one slave transaction per internal sample) need to wait
         MPU_Init_Data = [
-        [0x80, self.__MPUREG_PWR_MGMT_1],   # Reset Device
-        [0x01, self.__MPUREG_PWR_MGMT_1],          # Clock Source (PLL with X-axis gyroscope reference)
-        [0x00, self.__MPUREG_PWR_MGMT_2],          # Enable Acc & Gyro
-        [low_pass_filter, self.__MPUREG_CONFIG],   # Use DLPF set Gyroscope bandwidth 184Hz, temperature bandwidth 188Hz
-        [0x18, self.__MPUREG_GYRO_CONFIG],         # +-2000dps
-        [0x08, self.__MPUREG_ACCEL_CONFIG],        # +-4G
-        [0x09, self.__MPUREG_ACCEL_CONFIG_2],      # Set Acc Data Rates, Enable Acc LPF , Bandwidth 184Hz
-        [0x30, self.__MPUREG_INT_PIN_CFG],         # Bypass enable and active low
-        [0x20, self.__MPUREG_USER_CTRL],           # I2C Master mode
-        [0x0D, self.__MPUREG_I2C_MST_CTRL],        # I2C configuration multi-master, IIC 400KHz
-
-        [self.__AK8963_I2C_ADDR, self.__MPUREG_I2C_SLV0_ADDR],  # Set the I2C slave addres of AK8963 and set for write.
-        [self.__AK8963_CNTL2, self.__MPUREG_I2C_SLV0_REG], # I2C slave 0 register address from where to begin data transfer (CNTL2)
-        [0x01, self.__MPUREG_I2C_SLV0_DO], # Reset AK8963
-        [0x81, self.__MPUREG_I2C_SLV0_CTRL],  # Enable I2C and set 1 byte
-
-        [self.__AK8963_CNTL1, self.__MPUREG_I2C_SLV0_REG], # I2C slave 0 register address (CNTL1)
-        [0x12, self.__MPUREG_I2C_SLV0_DO], # Register value to continuous measurement in 16bit (Mode 2)
-        [0x81, self.__MPUREG_I2C_SLV0_CTRL]  # Enable I2C and set 1 byte
+        [0x80, self.__MPUREG_PWR_MGMT_1, 0.01],          # Reset Device
+        [0x01, self.__MPUREG_PWR_MGMT_1, 0.0],           # Clock Source (PLL with X-axis gyroscope reference)
+        [0x00, self.__MPUREG_PWR_MGMT_2, 0.0],           # Enable Acc & Gyro
+        [low_pass_filter, self.__MPUREG_CONFIG, 0.0],    # Use DLPF set Gyroscope bandwidth 184Hz, temperature bandwidth 188Hz
+        [0x18, self.__MPUREG_GYRO_CONFIG, 0.0],          # +-2000dps
+        [0x08, self.__MPUREG_ACCEL_CONFIG, 0.0],         # +-4G
+        [0x09, self.__MPUREG_ACCEL_CONFIG_2, 0.0],       # Set Acc Data Rates, Enable Acc LPF , Bandwidth 184Hz
+        [0x30, self.__MPUREG_INT_PIN_CFG, 0.0],          # Bypass enable and active low
+        [0x20, self.__MPUREG_USER_CTRL, 0.0],            # I2C Master mode
+        [0x0D, self.__MPUREG_I2C_MST_CTRL, 0.0],         # I2C configuration multi-master, IIC 400KHz
+
+        [self.__AK8963_I2C_ADDR, self.__MPUREG_I2C_SLV0_ADDR, 0.0],  # Set the I2C slave addres of AK8963 and set for write.
+        [self.__AK8963_CNTL2, self.__MPUREG_I2C_SLV0_REG, 0.0], # I2C slave 0 register address from where to begin data transfer (CNTL2)
+        [0x01, self.__MPUREG_I2C_SLV0_DO, 0.0], # Reset AK8963
+        [0x81, self.__MPUREG_I2C_SLV0_CTRL, 0.01],  # Enable I2C and set 1 byte
+
+        [self.__AK8963_CNTL1, self.__MPUREG_I2C_SLV0_REG, 0.0], # I2C slave 0 register address (CNTL1)
+        [0x16, self.__MPUREG_I2C_SLV0_DO, 0.0], # Register value to continuous measurement in 16bit (Mode 2, 100 Hz)
+        [0x81, self.__MPUREG_I2C_SLV0_CTRL, 0.002]  # Enable I2C and set 1 byte
         ]
 
         for i in range(0, MPU_InitRegNum):
             self.WriteReg(MPU_Init_Data[i][1], MPU_Init_Data[i][0])
-            time.sleep(0.01) # I2C must slow down the write speed, otherwise it won't work
+            if MPU_Init_Data[i][2]:
+                time.sleep(MPU_Init_Data[i][2]) # I2C must slow down the write speed, otherwise it won't work
 
         self.set_acc_scale(self.__BITS_FS_16G)
         self.set_gyro_scale(self.__BITS_FS_2000DPS)
 
         self.calib_mag()
+        self.enable_mag_autoread()
 
 # -----------------------------------------------------------------------------------------------
 #                                 ACCELEROMETER SCALE
@@ -306,6 +458,7 @@ class MPU9250:
             self.acc_divider = 4096.0
         elif (scale == self.__BITS_FS_16G):
             self.acc_divider = 2048.0
+        self.update_decoder()
 
         temp_scale = self.ReadReg(self.__MPUREG_ACCEL_CONFIG)
         if (temp_scale == self.__BITS_FS_2G):
@@ -333,6 +486,7 @@ class MPU9250:
             self.gyro_divider = 32.8
         elif (scale == self.__BITS_FS_2000DPS):
             self.gyro_divider = 16.4
+        self.update_decoder()
 
         temp_scale = self.ReadReg(self.__MPUREG_GYRO_CONFIG)
         if (temp_scale == self.__BITS_FS_250DPS):
@@ -359,12 +513,7 @@ class MPU9250:
 
     def read_acc(self):
         response = self.ReadRegs(self.__MPUREG_ACCEL_XOUT_H, 6)
-
-        for i in range(0, 3):
-            # Le slicing de liste fonctionne de la même manière en Python 3
-            data = self.byte_to_float(response[i*2:i*2+2])
-            # La division standard / donne un flottant en Python 3
-            self.accelerometer_data[i] = self.G_SI * data / self.acc_divider
+        self.decoder.decode_vector(response, self.accelerometer_data, self.decoder.acc_scale)
 
 # -----------------------------------------------------------------------------------------------
 #                                 READ GYROSCOPE
@@ -372,10 +521,7 @@ class MPU9250:
 
     def read_gyro(self):
         response = self.ReadRegs(self.__MPUREG_GYRO_XOUT_H, 6)
-
-        for i in range(0, 3):
-            data = self.byte_to_float(response[i*2:i*2+2])
-            self.gyroscope_data[i] = (self.PI/180) * data / self.gyro_divider
+        self.decoder.decode_vector(response, self.gyroscope_data, self.decoder.gyro_scale)
 
 # -----------------------------------------------------------------------------------------------
 #                                 READ TEMPERATURE
@@ -412,84 +558,207 @@ class MPU9250:
 
 # -----------------------------------------------------------------------------------------------
 
-    def AK8963_whoami(self):
+    def AK8963_read(self, reg, length):
+        # One-off read of AK8963 registers through slave 0, the auto-read is restored afterwards
         self.WriteReg(self.__MPUREG_I2C_SLV0_ADDR, self.__AK8963_I2C_ADDR | self.__READ_FLAG) #Set the I2C slave addres of AK8963 and set for read.
-        self.WriteReg(self.__MPUREG_I2C_SLV0_REG, self.__AK8963_WIA) #I2C slave 0 register address from where to begin data transfer
-        self.WriteReg(self.__MPUREG_I2C_SLV0_CTRL, 0x81) #Read 1 byte from the magnetometer
+        self.WriteReg(self.__MPUREG_I2C_SLV0_REG, reg) #I2C slave 0 register address from where to begin data transfer
+        self.WriteReg(self.__MPUREG_I2C_SLV0_CTRL, self.__BIT_I2C_SLV0_EN | length)
+        self.WriteReg(self.__MPUREG_I2C_MST_DELAY_CTRL, 0x00)
 
         time.sleep(0.01)
 
-        return self.ReadReg(self.__MPUREG_EXT_SENS_DATA_00) # Read I2C
+        response = list(self.ReadRegs(self.__MPUREG_EXT_SENS_DATA_00, length)) # Read I2C
+        if self.mag_rate:
+            self.enable_mag_autoread(self.mag_rate)
+        return response
+
+    def AK8963_whoami(self):
+        return self.AK8963_read(self.__AK8963_WIA, 1)[0]
 
 # -----------------------------------------------------------------------------------------------
 
     def calib_mag(self):
-        # Set the I2C slave addres of AK8963 and set for read.
-        self.WriteReg(self.__MPUREG_I2C_SLV0_ADDR, self.__AK8963_I2C_ADDR | self.__READ_FLAG)
-        # I2C slave 0 register address from where to begin data transfer
-        self.WriteReg(self.__MPUREG_I2C_SLV0_REG, self.__AK8963_ASAX)
-        # Read 3 bytes from the magnetometer
-        self.WriteReg(self.__MPUREG_I2C_SLV0_CTRL, 0x83)
-
-        time.sleep(0.01)
-
-        response = self.ReadRegs(self.__MPUREG_EXT_SENS_DATA_00, 3)
+        # The sensitivity adjustment values are factory constants but nothing ties a cached copy to
+        # this AK8963 (SD card moved to another board, magnetometer replaced): the three fuse ROM
+        # bytes are read again, one short slave read, and replace a cached entry that differs
+        response = self.AK8963_read(self.__AK8963_ASAX, 3)
+        if self.cache:
+            cached = self.cache.get("ak8963_asa")
+            if cached != response:
+                if cached is not None:
+                    print(f"Warning: cached AK8963 sensitivity adjustment {cached} does not match the sensor "
+                          f"({response}), cache updated")
+                self.cache.put("ak8963_asa", response)
 
         for i in range(0, 3):
             self.magnetometer_ASA[i] = ((float(response[i]) - 128)/256 + 1) * self.__Magnetometer_Sensitivity_Scale_Factor
+        self.update_decoder()
 
 # -----------------------------------------------------------------------------------------------
 
-    def read_mag(self):
-        # Set the I2C slave addres of AK8963 and set for read.
+    def update_decoder(self):
+        acc_scale = self.G_SI / self.acc_divider if self.acc_divider else 0.0
+        gyro_scale = (self.PI/180) / self.gyro_divider if self.gyro_divider else 0.0
+        self.decoder.set_scales(acc_scale, gyro_scale, self.magnetometer_ASA)
+
+# -----------------------------------------------------------------------------------------------
+
+    def enable_mag_autoread(self, mag_rate = MAG_RATE):
+        # The I2C master reads ST1..ST2 of the AK8963 into EXT_SENS_DATA_00..07 on its own, every
+        # 1 + I2C_MST_DLY internal samples so that it follows the magnetometer rate rather than the
+        # accel/gyro rate. Reading ST2 releases the AK8963 data registers for the next measurement.
         self.WriteReg(self.__MPUREG_I2C_SLV0_ADDR, self.__AK8963_I2C_ADDR | self.__READ_FLAG)
-        # I2C slave 0 register address from where to begin data transfer
-        self.WriteReg(self.__MPUREG_I2C_SLV0_REG, self.__AK8963_HXL)
-        # Read 6 bytes from the magnetometer
-        self.WriteReg(self.__MPUREG_I2C_SLV0_CTRL, 0x87)
+        self.WriteReg(self.__MPUREG_I2C_SLV0_REG, self.__AK8963_ST1)
+        self.WriteReg(self.__MPUREG_I2C_SLV0_CTRL, self.__BIT_I2C_SLV0_EN | self.__MAG_BLOCK)
+        self.mag_rate = mag_rate
+        self.set_mag_delay()
 
-        time.sleep(0.01)
+# -----------------------------------------------------------------------------------------------
 
-        response = self.ReadRegs(self.__MPUREG_EXT_SENS_DATA_00, 7)
-        #must start your read from AK8963A register 0x03 and read seven bytes so that upon read of ST2 register 0x09 the AK8963A will unlatch the data registers for the next measurement.
-        for i in range(0, 3):
-            data = self.byte_to_float_le(response[i*2:i*2+2])
-            self.magnetometer_data[i] = data * self.magnetometer_ASA[i]
+    def set_mag_delay(self):
+        # Slave delay for the current internal sample rate, the auto-read runs at least at mag_rate
+        sample_rate = self.__FIFO_INTERNAL_RATE / (1 + self.sample_rate_div)
+        delay = min(0x1F, max(0, int(sample_rate / self.mag_rate) - 1))
+        self.WriteReg(self.__MPUREG_I2C_SLV4_CTRL, delay)
+        self.WriteReg(self.__MPUREG_I2C_MST_DELAY_CTRL, self.__BIT_I2C_SLV0_DLY_EN if delay else 0x00)
+
+# -----------------------------------------------------------------------------------------------
+
+    def __mag_status(self, block):
+        # block: ST1, HXL..HZH, ST2. Reads faster than the auto-read see the same block again.
+        st1 = block[0]
+        self.mag_fresh = bool(st1 & self.__BIT_AK8963_DRDY) and block != self.__mag_block
+        self.mag_overrun = bool(st1 & self.__BIT_AK8963_DOR)
+        self.mag_overflow = bool(block[7] & self.__BIT_AK8963_HOFL)
+        self.__mag_block = block
+
+    def read_mag(self):
+        # Latest sample mirrored by the auto-read, see enable_mag_autoread()
+        response = self.ReadRegs(self.__MPUREG_EXT_SENS_DATA_00, self.__MAG_BLOCK)
+        self.__mag_status(response)
+        if not self.mag_overflow:
+            for i in range(0, 3):
+                data = self.byte_to_float_le(response[1+i*2:3+i*2])
+                self.magnetometer_data[i] = data * self.magnetometer_ASA[i]
 
 # -----------------------------------------------------------------------------------------------
 
     def read_all(self):
-        # Send I2C command at first
-        # Set the I2C slave addres of AK8963 and set for read.
-        self.WriteReg(self.__MPUREG_I2C_SLV0_ADDR, self.__AK8963_I2C_ADDR | self.__READ_FLAG)
-        # I2C slave 0 register address from where ; //Read 7 bytes from the magnetometerto begin data transfer
-        self.WriteReg(self.__MPUREG_I2C_SLV0_REG, self.__AK8963_HXL)
-        # Read 7 bytes from the magnetometer
-        self.WriteReg(self.__MPUREG_I2C_SLV0_CTRL, 0x87)
-        # must start your read from AK8963A register 0x03 and read seven bytes so that upon read of ST2 register 0x09 the AK8963A will unlatch the data registers for the next measurement.
+        # Accel, temperature, gyro and the magnetometer block mirrored by the auto-read in a
+        # single burst: ST1 at offset 14, HXL..HZH at 15 and ST2 at 21
+        response = self.ReadRegs(self.__MPUREG_ACCEL_XOUT_H, self.__SAMPLE_SIZE)
+        self.__mag_status(response[14:])
 
-        # time.sleep(0.001)
-        response = self.ReadRegs(self.__MPUREG_ACCEL_XOUT_H, 21);
+        # Accel, temperature, gyro (big-endian) and magnetometer (little-endian) in one pass
+        self.temperature = self.decoder.decode_all(response, self.accelerometer_data, self.gyroscope_data,
+                                                   None if self.mag_overflow else self.magnetometer_data, 15)
 
-        # Get Accelerometer values
-        for i in range(0, 3):
-            data = self.byte_to_float(response[i*2:i*2+2])
-            self.accelerometer_data[i] = self.G_SI * data / self.acc_divider
+# -----------------------------------------------------------------------------------------------
+#                                     SAMPLE RATE & INTERRUPT
+# usage: set_sample_rate() then enable_data_ready_interrupt() to get an INT pulse at every new
+# sample, so reads follow the sensor clock instead of a timer
+# -----------------------------------------------------------------------------------------------
 
-        # Get temperature
-        i = 3
-        temp = self.byte_to_float(response[i*2:i*2+2])
-        self.temperature = (temp/340.0)+36.53
+    def set_sample_rate_div(self, sample_rate_div):
+        self.WriteReg(self.__MPUREG_SMPLRT_DIV, sample_rate_div)
+        self.sample_rate_div = sample_rate_div
+        self.sample_period = (1 + sample_rate_div) / self.__FIFO_INTERNAL_RATE
+        if self.mag_rate:
+            self.set_mag_delay()
+
+    def set_sample_rate(self, rate):
+        # Closest rate available (about 3.9 Hz to 1 kHz), returns it
+        self.set_sample_rate_div(min(255, max(0, int(round(self.__FIFO_INTERNAL_RATE / rate)) - 1)))
+        return 1.0 / self.sample_period
 
-        # Get gyroscope values
-        for i in range(4, 7):
-            data = self.byte_to_float(response[i*2:i*2+2])
-            self.gyroscope_data[i-4] = (self.PI/180) * data / self.gyro_divider
+# -----------------------------------------------------------------------------------------------
+
+    def enable_data_ready_interrupt(self):
+        # INT active high, push-pull, 50 us pulse per sample, status cleared by any register read
+        self.WriteReg(self.__MPUREG_INT_PIN_CFG, self.__BIT_INT_ANYRD_2CLEAR)
+        self.WriteReg(self.__MPUREG_INT_ENABLE, self.__BIT_RAW_RDY_EN)
+
+    def disable_interrupts(self):
+        self.WriteReg(self.__MPUREG_INT_ENABLE, 0x00)
+
+# -----------------------------------------------------------------------------------------------
+#                                          FIFO MODE
+# usage: call enable_fifo() once, then read_fifo() periodically to drain every buffered
+# accel/temp/gyro frame in a single SPI transfer. The FIFO holds FIFO_SIZE bytes, i.e. about
+# 36 frames, so it must be drained at least every ~35 ms at 1 kHz.
+# -----------------------------------------------------------------------------------------------
+
+    def enable_fifo(self, sample_rate_div = 0):
+        # Output rate = 1 kHz / (1 + sample_rate_div) as long as the DLPF is enabled
+        self.set_sample_rate_div(sample_rate_div)
+        self.fifo_period = self.sample_period
+        self.__fifo_next = None
+        self.WriteReg(self.__MPUREG_FIFO_EN, 0x00)
+        self.WriteReg(self.__MPUREG_USER_CTRL, self.__BIT_I2C_MST_EN | self.__BIT_FIFO_RST)
+        self.WriteReg(self.__MPUREG_FIFO_EN, self.__BIT_TEMP_FIFO_EN | self.__BIT_XG_FIFO_EN |
+                      self.__BIT_YG_FIFO_EN | self.__BIT_ZG_FIFO_EN | self.__BIT_ACCEL_FIFO_EN)
+        self.WriteReg(self.__MPUREG_USER_CTRL, self.__BIT_I2C_MST_EN | self.__BIT_FIFO_EN)
+        self.fifo_enabled = True
+
+# -----------------------------------------------------------------------------------------------
+
+    def disable_fifo(self):
+        self.WriteReg(self.__MPUREG_FIFO_EN, 0x00)
+        self.WriteReg(self.__MPUREG_USER_CTRL, self.__BIT_I2C_MST_EN | self.__BIT_FIFO_RST)
+        self.fifo_enabled = False
+        self.__fifo_next = None
+
+# -----------------------------------------------------------------------------------------------
+
+    def reset_fifo(self):
+        self.__fifo_next = None
+        self.WriteReg(self.__MPUREG_USER_CTRL, self.__BIT_I2C_MST_EN | self.__BIT_FIFO_RST)
+        self.WriteReg(self.__MPUREG_USER_CTRL, self.__BIT_I2C_MST_EN | self.__BIT_FIFO_EN)
+
+# -----------------------------------------------------------------------------------------------
+
+    def fifo_count(self):
+        response = self.ReadRegs(self.__MPUREG_FIFO_COUNTH, 2)
+        return ((response[0] & 0x1F) << 8) | response[1]
+
+# -----------------------------------------------------------------------------------------------
 
-        # Get magnetometer values
-        for i in range(7, 10):
-            data = self.byte_to_float_le(response[i*2:i*2+2])
-            self.magnetometer_data[i-7] = data * self.magnetometer_ASA[i-7]
+    def read_fifo(self, max_frames = None):
+        # Returns (timestamps, acc, gyro, temp) arrays for every complete frame in the FIFO, oldest
+        # first. They are views on preallocated buffers, valid until the next call.
+        # Timestamps follow a running frame counter: the first block is anchored backwards from the
+        # read time, the next ones continue one fifo_period after the previous frame. The counter is
+        # re-anchored when it drifts from the read time by more than FIFO_RESYNC.
+        if self.ReadReg(self.__MPUREG_INT_STATUS) & self.__BIT_FIFO_OFLOW_INT:
+            # Frame boundaries are lost once the FIFO wraps, start over
+            self.fifo_overflows += 1
+            self.reset_fifo()
+            frames = 0
+        else:
+            available = self.fifo_count() // self.FIFO_FRAME_SIZE
+            frames = available if max_frames is None else min(available, max_frames)
+        if frames == 0:
+            empty = self.decoder.fifo_out[:0]
+            return self.__fifo_t[:0], empty[:, 0:3], empty[:, 4:7], empty[:, 3]
+
+        t_read = time.time()
+        response = self.ReadRegs(self.__MPUREG_FIFO_R_W, frames * self.FIFO_FRAME_SIZE)
+        block = self.decoder.decode_fifo(response, frames)
+
+        # Oldest frame of the block as seen from the read time, the newest one in the FIFO being
+        # the latest sample
+        t_first = t_read - (available - 1) * self.fifo_period
+        if self.__fifo_next is None:
+            self.__fifo_next = t_first
+        elif abs(self.__fifo_next - t_first) > self.FIFO_RESYNC:
+            self.fifo_resyncs += 1
+            self.__fifo_next = t_first
+        t = self.__fifo_t[:frames]
+        np.multiply(self.__fifo_age[-frames:], -self.fifo_period, out=t)
+        t += self.__fifo_next + (frames - 1) * self.fifo_period
+        self.__fifo_next += frames * self.fifo_period
+
+        return t, block[:, 0:3], block[:, 4:7], block[:, 3]
 
 # -----------------------------------------------------------------------------------------------
 #                                          GET VALUES
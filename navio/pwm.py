@@ -1,6 +1,5 @@
-import smbus
 import time
-from gpiozero import LED
+import navio.bus as navio_bus
 
 class NavioPWM:
 
@@ -24,16 +23,23 @@ class NavioPWM:
 
     # Bits
     __RESTART = 0x80
+    __AI = 0x20
     __SLEEP = 0x10
     __ALLCALL = 0x01
     __INVRT = 0x10
     __OUTDRV = 0x04
     __FULL_OFF = 0x10
 
+    CHANNELS = 16
+    OSCILLATOR_HZ = 25000000.0
+    __MAX_BLOCK = 32  # SMBus block write limit: 8 channels per transaction
+
     def __init__(self):
-        self.bus = smbus.SMBus(1)
+        self.bus = navio_bus.open_i2c(1, "pca9685", navio_bus.I2CArbiter.LOW)
         self.address = 0x40
-        self.pin_enable = LED(self.__GPIO_OUT_ENBL)
+        self.pin_enable = navio_bus.output_pin(self.__GPIO_OUT_ENBL)
+        self.registers = bytearray((0, 0, 0, self.__FULL_OFF) * self.CHANNELS)  # shadow of LED0_ON_L..LED15_OFF_H
+        self.frequency = self.OSCILLATOR_HZ / (4096 * (0x1E + 1))  # power-on prescale
 
     def set_all_pwm(self, on, off):
         """Sets all PWM channels"""
@@ -43,13 +49,46 @@ class NavioPWM:
         self.bus.write_byte_data(self.address, self.__ALL_LED_OFF_H, off >> 8)
 
     def set_pwm(self, channel, duty_cycle=0.5, delay=0.0):
-        if delay + duty_cycle <= 1:
-            on = int(delay*4095)
-            off = int(duty_cycle*4095) + on
-            self.bus.write_byte_data(self.address, self.__LED0_ON_L + 4 * channel, on & 0xFF)
-            self.bus.write_byte_data(self.address, self.__LED0_ON_H + 4 * channel, on >> 8)
-            self.bus.write_byte_data(self.address, self.__LED0_OFF_L + 4 * channel, off & 0xFF)
-            self.bus.write_byte_data(self.address, self.__LED0_OFF_H + 4 * channel, off >> 8)
+        self.set_channels({channel: (duty_cycle, delay)})
+
+    def set_channels(self, channels, us=False):
+        # channels: {channel: duty_cycle} or {channel: (duty_cycle, delay)}, as fractions of the period,
+        # or in microseconds with us=True. The registers from the lowest to the highest channel are
+        # sent as auto-increment block writes (unchanged channels in between are resent from the
+        # shadow copy), 8 channels per transaction. The writes are posted to the bus arbiter without
+        # waiting, a newer update of the same channels replaces one still queued. Settings with
+        # duty_cycle + delay > 1 are ignored.
+        first = last = None
+        for channel, value in channels.items():
+            duty_cycle, delay = value if isinstance(value, tuple) else (value, 0.0)
+            if us:
+                duty_cycle *= self.frequency / 1e6
+                delay *= self.frequency / 1e6
+            if delay + duty_cycle <= 1:
+                on = int(delay*4095)
+                off = int(duty_cycle*4095) + on
+                self.registers[4 * channel:4 * channel + 4] = bytes((on & 0xFF, on >> 8, off & 0xFF, off >> 8))
+                first = channel if first is None else min(first, channel)
+                last = channel if last is None else max(last, channel)
+        if first is None:
+            return
+        start, end = 4 * first, 4 * (last + 1)
+        for offset in range(start, end, self.__MAX_BLOCK):
+            block = list(self.registers[offset:min(offset + self.__MAX_BLOCK, end)])
+            self.bus.post_write_block(self.address, self.__LED0_ON_L + offset, block)
+
+    def set_frequency(self, frequency):
+        # PWM frequency (about 24 to 1526 Hz), the prescaler can only be changed in sleep mode
+        prescale = min(255, max(3, int(round(self.OSCILLATOR_HZ / (4096 * frequency))) - 1))
+        mode1 = self.bus.read_byte_data(self.address, self.__MODE1) & ~self.__RESTART
+        self.bus.write_byte_data(self.address, self.__MODE1, mode1 | self.__SLEEP)
+        self.bus.write_byte_data(self.address, self.__PRESCALE, prescale)
+        self.bus.write_byte_data(self.address, self.__MODE1, mode1)
+        if not mode1 & self.__SLEEP:
+            time.sleep(0.0005)  # wait for oscillator
+            self.bus.write_byte_data(self.address, self.__MODE1, mode1 | self.__RESTART)
+        self.frequency = self.OSCILLATOR_HZ / (4096 * (prescale + 1))
+        return self.frequency
 
     def start(self):
         self.bus.write_byte_data(self.address, self.__ALL_LED_OFF_H, self.__FULL_OFF)
@@ -57,9 +96,11 @@ class NavioPWM:
         # self.bus.write_byte_data(self.address, self.__MODE1, self.__ALLCALL)
         time.sleep(0.005)  # wait for oscillator
         mode1 = self.bus.read_byte_data(self.address, self.__MODE1)
-        mode1 = mode1 & ~self.__SLEEP  # wake up (reset sleep)
+        mode1 = (mode1 & ~self.__SLEEP) | self.__AI  # wake up (reset sleep), register auto-increment for block writes
         self.bus.write_byte_data(self.address, self.__MODE1, mode1)
         time.sleep(0.005)  # wait for oscillator
+        self.frequency = self.OSCILLATOR_HZ / (4096 * (self.bus.read_byte_data(self.address, self.__PRESCALE) + 1))
+        self.registers = bytearray((0, 0, 0, self.__FULL_OFF) * self.CHANNELS)  # ALL_LED_OFF_H applies to every channel
         self.pin_enable.off()  # Reversed logic
 
     def shutdown(self):
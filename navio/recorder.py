@@ -0,0 +1,201 @@
+import os
+import glob
+import json
+import mmap
+import time
+import struct
+import threading
+from collections import deque
+import numpy as np
+
+
+IMU_DTYPE = np.dtype([("t", "<f8"), ("acc", "<f4", 3), ("gyro", "<f4", 3), ("mag", "<f4", 3), ("temp", "<f4")])
+BARO_DTYPE = np.dtype([("t", "<f8"), ("d1", "<u4"), ("d2", "<u4"), ("pressure", "<f8"), ("temperature", "<f8")])
+
+
+class RecordingFile:
+
+    # File layout: a HEADER_SIZE header then fixed-size records (numpy structured dtype).
+    # Header: magic, header size, record size, record count, creation time, then the dtype as JSON.
+    # The file is preallocated and memory-mapped, appending a record is a memory copy and the
+    # record count lives in the mapped header, so writing never issues a syscall.
+
+    MAGIC = b"NAVIOREC"
+    HEADER = struct.Struct("<8sIIQdI")
+    HEADER_SIZE = mmap.PAGESIZE
+    COUNT_OFFSET = 16
+
+    def __init__(self, path, dtype, max_records):
+        self.path = path
+        self.dtype = dtype
+        self.max_records = max_records
+        self.count = 0
+        self.t_created = time.time()
+        descr = json.dumps(dtype.descr).encode()
+        with open(path, "wb") as f:
+            f.truncate(self.HEADER_SIZE + max_records * dtype.itemsize)
+        self.fd = os.open(path, os.O_RDWR)
+        self.mm = mmap.mmap(self.fd, self.HEADER_SIZE + max_records * dtype.itemsize)
+        self.HEADER.pack_into(self.mm, 0, self.MAGIC, self.HEADER_SIZE, dtype.itemsize, 0, self.t_created, len(descr))
+        self.mm[self.HEADER.size:self.HEADER.size + len(descr)] = descr
+        self.records = np.frombuffer(self.mm, dtype=dtype, count=max_records, offset=self.HEADER_SIZE)
+
+    def free(self):
+        return self.max_records - self.count
+
+    def write(self, chunk):
+        n = len(chunk)
+        self.records[self.count:self.count + n] = chunk
+        self.count += n
+        struct.pack_into("<Q", self.mm, self.COUNT_OFFSET, self.count)
+
+    def close(self):
+        # Release the mapping and trim the unused preallocated space
+        self.records = None
+        self.mm.flush()
+        self.mm.close()
+        os.ftruncate(self.fd, self.HEADER_SIZE + self.count * self.dtype.itemsize)
+        os.close(self.fd)
+
+
+class Recorder:
+
+    # Append-only recorder of fixed-size records with size/time based rotation.
+    # record() / record_block() only append to an in-memory queue and never block the acquisition
+    # thread, a writer thread copies queued records into the memory-mapped file. If the writer falls
+    # behind by more than `queue_size` entries, the oldest ones are dropped and counted.
+    # Records passed after shutdown() are ignored.
+
+    def __init__(self, directory, name, dtype, max_bytes=64*1024*1024, max_seconds=3600.0,
+                 period=0.25, queue_size=100000):
+        self.directory = directory
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.max_records = max(1, (max_bytes - RecordingFile.HEADER_SIZE) // self.dtype.itemsize)
+        self.max_seconds = max_seconds
+        self.period = period
+        self.queue = deque(maxlen=queue_size)
+        self.dropped = 0
+        self.written = 0
+        self.file = None
+        self.run = False
+        self.stopped = False
+        self.t_update = None
+
+    def record(self, row):
+        # row: tuple in dtype field order, e.g. (t, (ax, ay, az), (gx, gy, gz), (mx, my, mz), temp)
+        if self.stopped:
+            return
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(row)
+
+    def record_block(self, **columns):
+        # One structured chunk per block, copied now since the caller's buffers are reused
+        if self.stopped:
+            return
+        n = len(columns["t"])
+        chunk = np.empty(n, dtype=self.dtype)
+        for name, values in columns.items():
+            chunk[name] = values
+        self.record(chunk)
+
+    def __new_file(self):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self.directory, f"{self.name}-{stamp}.rec")
+        i = 1
+        while os.path.exists(path):
+            path = os.path.join(self.directory, f"{self.name}-{stamp}-{i}.rec")
+            i += 1
+        return RecordingFile(path, self.dtype, self.max_records)
+
+    def __write(self, chunk):
+        while len(chunk):
+            if self.file is None:
+                self.file = self.__new_file()
+            n = min(len(chunk), self.file.free())
+            self.file.write(chunk[:n])
+            self.written += n
+            chunk = chunk[n:]
+            if self.file.free() == 0:
+                self.file.close()
+                self.file = None
+
+    def flush(self):
+        rows = []
+        while self.queue:
+            item = self.queue.popleft()
+            if isinstance(item, np.ndarray):
+                if rows:
+                    self.__write(np.array(rows, dtype=self.dtype))
+                    rows = []
+                self.__write(item)
+            else:
+                rows.append(item)
+        if rows:
+            self.__write(np.array(rows, dtype=self.dtype))
+        if self.file is not None and time.time() - self.file.t_created > self.max_seconds:
+            self.file.close()
+            self.file = None
+
+    def __update(self):
+        while self.run:
+            self.flush()
+            time.sleep(self.period)
+        self.flush()
+
+    def start(self):
+        if not self.t_update:
+            os.makedirs(self.directory, exist_ok=True)
+            self.run = True
+            self.t_update = threading.Thread(target=self.__update)
+            self.t_update.start()
+
+    def shutdown(self):
+        self.stopped = True
+        self.run = False
+        if self.t_update:
+            self.t_update.join()
+            self.t_update = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class Recording:
+
+    # Read-only view of a recording file: slicing and field access return numpy views on the
+    # memory-mapped records, nothing is copied.
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(RecordingFile.HEADER_SIZE)
+        magic, header_size, record_size, count, self.t_created, descr_len = RecordingFile.HEADER.unpack_from(header)
+        if magic != RecordingFile.MAGIC:
+            raise ValueError(f"Not a navio recording: {path}")
+        descr = json.loads(header[RecordingFile.HEADER.size:RecordingFile.HEADER.size + descr_len])
+        self.dtype = np.dtype([tuple(field) for field in descr])
+        if count == 0:
+            self.records = np.zeros(0, dtype=self.dtype)
+        else:
+            self.records = np.memmap(path, dtype=self.dtype, mode="r", offset=header_size, shape=(count,))
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, key):
+        return self.records[key]
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def chunks(self, size=4096):
+        for start in range(0, len(self.records), size):
+            yield self.records[start:start + size]
+
+    @staticmethod
+    def find(directory, name):
+        # Recording files of a recorder, oldest first
+        recordings = [Recording(path) for path in glob.glob(os.path.join(directory, f"{name}-*.rec"))]
+        return sorted(recordings, key=lambda recording: recording.t_created)
@@ -0,0 +1,192 @@
+import time
+import numpy as np
+
+
+class SampleRing:
+
+    # Fixed-capacity ring of timestamped samples, one float64 row per sample, one column per field
+    # (the first field is the timestamp).
+    # Single producer, any number of readers, no lock: the producer bumps `seq` to an odd value
+    # while it writes and back to an even value when done (seqlock), readers retry if it changed.
+    # Every row is stored twice (at i and i + capacity) so any window of up to `capacity` samples
+    # is one contiguous slice and can be handed out as a view without copying. A view stays
+    # intact until the producer has written `capacity - len(view)` more samples; readers that keep
+    # a block while the producer runs (encoders, history) ask for a consistent copy instead.
+
+    def __init__(self, fields, capacity=4096):
+        self.fields = tuple(fields)
+        self.index = {name: i for i, name in enumerate(self.fields)}
+        self.capacity = capacity
+        self.data = np.zeros((2 * capacity, len(self.fields)))
+        self.seq = 0
+        self.count = 0  # total number of samples written
+
+    def append(self, row):
+        pos = self.count % self.capacity
+        self.seq += 1
+        self.data[pos] = row
+        self.data[pos + self.capacity] = row
+        self.count += 1
+        self.seq += 1
+
+    def extend(self, block):
+        n = len(block)
+        if n == 0:
+            return
+        if n > self.capacity:
+            block = block[n - self.capacity:]
+            skipped = n - self.capacity
+            n = self.capacity
+        else:
+            skipped = 0
+        pos = (self.count + skipped) % self.capacity
+        first = min(n, self.capacity - pos)
+        self.seq += 1
+        self.data[pos:pos + first] = block[:first]
+        self.data[pos + self.capacity:pos + self.capacity + first] = block[:first]
+        if first < n:
+            self.data[0:n - first] = block[first:]
+            self.data[self.capacity:self.capacity + n - first] = block[first:]
+        self.count += skipped + n
+        self.seq += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def __view(self, n):
+        count = self.count
+        n = min(n, count, self.capacity)
+        start = (count - n) % self.capacity
+        return self.data[start:start + n]
+
+    def latest(self):
+        # Consistent copy of the last sample, None if nothing was written yet
+        while True:
+            seq = self.seq
+            if seq & 1:
+                time.sleep(0)  # let the producer finish its write
+                continue
+            if self.count == 0:
+                return None
+            row = self.data[(self.count - 1) % self.capacity].copy()
+            if seq == self.seq:
+                return row
+
+    def window(self, n, copy=False):
+        # View of the last n samples (fewer if not available yet), oldest first, or a copy taken
+        # under the seqlock with copy=True
+        while True:
+            seq = self.seq
+            if seq & 1:
+                time.sleep(0)  # let the producer finish its write
+                continue
+            view = self.__view(n)
+            if copy:
+                view = view.copy()
+            if seq == self.seq:
+                return view
+
+    def since(self, t, copy=False):
+        # View of every buffered sample with a timestamp strictly greater than t, or a copy taken
+        # under the seqlock with copy=True
+        while True:
+            seq = self.seq
+            if seq & 1:
+                time.sleep(0)  # let the producer finish its write
+                continue
+            view = self.__view(self.capacity)
+            view = view[np.searchsorted(view[:, 0], t, side='right'):]
+            if copy:
+                view = view.copy()
+            if seq == self.seq:
+                return view
+
+    def column(self, view, name):
+        return view[:, self.index[name]]
+
+
+class SharedSampleRing(SampleRing):
+
+    # SampleRing in a multiprocessing.shared_memory block, written by one process (create) and
+    # read by any number of others (attach, read-only arrays). Same seqlock protocol, with seq and
+    # count in a shared int64 header. Layout: header (capacity, field count, seq, count), the
+    # comma-separated field names in FIELDS_SIZE bytes, then the doubled float64 rows.
+
+    FIELDS_SIZE = 1024
+    __HEADER = 4 * 8
+
+    def __init__(self, shm, fields, capacity, writable):
+        self.shm = shm
+        self.fields = tuple(fields)
+        self.index = {name: i for i, name in enumerate(self.fields)}
+        self.capacity = capacity
+        self.header = np.ndarray((4,), dtype=np.int64, buffer=shm.buf)
+        self.data = np.ndarray((2 * capacity, len(self.fields)), dtype=np.float64, buffer=shm.buf,
+                               offset=self.__HEADER + self.FIELDS_SIZE)
+        if not writable:
+            self.header.flags.writeable = False
+            self.data.flags.writeable = False
+
+    @property
+    def seq(self):
+        return int(self.header[2])
+
+    @seq.setter
+    def seq(self, value):
+        self.header[2] = value
+
+    @property
+    def count(self):
+        return int(self.header[3])
+
+    @count.setter
+    def count(self, value):
+        self.header[3] = value
+
+    @classmethod
+    def create(cls, name, fields, capacity=4096):
+        from multiprocessing import shared_memory
+        names = ",".join(fields).encode()
+        if len(names) > cls.FIELDS_SIZE:
+            raise ValueError(f"Field names of {name} exceed {cls.FIELDS_SIZE} bytes")
+        size = cls.__HEADER + cls.FIELDS_SIZE + 2 * capacity * len(fields) * 8
+        try:
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            # Left over by a producer that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        shm.buf[cls.__HEADER:cls.__HEADER + cls.FIELDS_SIZE] = names.ljust(cls.FIELDS_SIZE, b"\0")
+        ring = cls(shm, fields, capacity, True)
+        ring.header[:] = (capacity, len(fields), 0, 0)
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        # Raises FileNotFoundError while the producer has not created the ring
+        from multiprocessing import shared_memory
+        try:
+            shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError:
+            # Before Python 3.13 every attached process registers the block with its resource
+            # tracker, which would unlink it when the reader exits
+            from multiprocessing import resource_tracker
+            shm = shared_memory.SharedMemory(name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+        capacity, n_fields = (int(v) for v in np.ndarray((2,), dtype=np.int64, buffer=shm.buf))
+        names = bytes(shm.buf[cls.__HEADER:cls.__HEADER + cls.FIELDS_SIZE]).rstrip(b"\0").decode()
+        fields = names.split(",")
+        if len(fields) != n_fields:
+            shm.close()
+            raise ValueError(f"Corrupted shared ring header in {name}")
+        return cls(shm, fields, capacity, False)
+
+    def close(self):
+        # Views returned by window()/since() must not be used afterwards
+        self.header = self.data = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
@@ -0,0 +1,171 @@
+import math
+import time
+import threading
+import navio.metrics as navio_metrics
+
+
+class Task:
+
+    def __init__(self, name, function, period, priority, deadline):
+        self.name = name
+        self.function = function
+        self.period = period
+        self.priority = priority
+        self.deadline = deadline
+        self.runs = 0
+        self.overruns = 0  # runs that ended after the next deadline
+        self.skipped = 0   # periods dropped to catch up after overruns
+        self.errors = 0
+        self.last_error = None
+        self.max_lateness = 0.0
+        self.total_lateness = 0.0
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+        self.t_last = None
+        self.period_metric = navio_metrics.histogram(
+            "navio_loop_period_seconds", "Time between the starts of consecutive runs of a task", task=name)
+        self.jitter_metric = navio_metrics.histogram(
+            "navio_loop_jitter_seconds", "Delay between the deadline of a task and the start of its run", task=name)
+        self.duration_metric = navio_metrics.histogram(
+            "navio_loop_duration_seconds", "Duration of the runs of a task", task=name)
+        self.overrun_metric = navio_metrics.counter(
+            "navio_loop_overruns_total", "Runs of a task that ended after its next deadline", task=name)
+
+    def stats(self):
+        runs = max(self.runs, 1)
+        return {
+            "period": self.period,
+            "priority": self.priority,
+            "runs": self.runs,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "mean_lateness": self.total_lateness / runs,
+            "max_lateness": self.max_lateness,
+            "mean_duration": self.total_duration / runs,
+            "max_duration": self.max_duration,
+        }
+
+
+class Scheduler:
+
+    # Runs every registered periodic task from a single thread at absolute deadlines on
+    # time.monotonic(). The next deadline is the previous one plus the period, so neither the task
+    # duration nor the sleep jitter accumulates. When several tasks are due, the lowest priority
+    # value runs first, then the earliest deadline. A run ending after the task's next deadline is
+    # an overrun: the missed periods are skipped rather than run back to back.
+    # A task may return an absolute time.monotonic() deadline for its next run instead of using
+    # its period (e.g. a conversion that completes at a known time). A task added with
+    # period=None only runs when triggered.
+    # The thread starts with the first task and ends when the last one is removed.
+
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+    def __init__(self):
+        self.tasks = []
+        self.cond = threading.Condition()
+        self.current = None
+        self.t_update = None
+
+    def add(self, name, function, period, priority=NORMAL, delay=0.0):
+        deadline = time.monotonic() + delay if period is not None or delay else math.inf
+        task = Task(name, function, period, priority, deadline)
+        with self.cond:
+            self.tasks.append(task)
+            if self.t_update is None:
+                self.t_update = threading.Thread(target=self.__update, name="scheduler")
+                self.t_update.start()
+            self.cond.notify_all()
+        return task
+
+    def remove(self, task):
+        # Returns once the task is no longer running (immediately when called from a task)
+        with self.cond:
+            if task in self.tasks:
+                self.tasks.remove(task)
+            if threading.current_thread() is not self.t_update:
+                self.cond.wait_for(lambda: self.current is not task)
+            self.cond.notify_all()
+
+    def trigger(self, task, deadline=None):
+        # Run a task now (or at `deadline`) instead of at its next periodic deadline
+        with self.cond:
+            task.deadline = time.monotonic() if deadline is None else deadline
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return {task.name: task.stats() for task in self.tasks}
+
+    def __next_task(self):
+        with self.cond:
+            while True:
+                if not self.tasks:
+                    self.t_update = None
+                    return None
+                now = time.monotonic()
+                due = [task for task in self.tasks if task.deadline <= now]
+                if due:
+                    self.current = min(due, key=lambda task: (task.priority, task.deadline))
+                    return self.current
+                deadline = min(task.deadline for task in self.tasks)
+                self.cond.wait(None if deadline == math.inf else deadline - now)
+
+    def __update(self):
+        while True:
+            task = self.__next_task()
+            if task is None:
+                return
+            t_start = time.monotonic()
+            try:
+                deadline = task.function()
+            except Exception as e:
+                deadline = None
+                task.errors += 1
+                task.last_error = f"{type(e).__name__}: {e}"
+                print(f"Error: scheduled task {task.name} failed ({task.last_error})")
+            t_end = time.monotonic()
+            lateness = t_start - task.deadline
+            if task.t_last is not None:
+                task.period_metric.observe(t_start - task.t_last)
+            task.t_last = t_start
+            task.jitter_metric.observe(lateness)
+            task.duration_metric.observe(t_end - t_start)
+            task.runs += 1
+            task.total_lateness += lateness
+            task.max_lateness = max(task.max_lateness, lateness)
+            task.total_duration += t_end - t_start
+            task.max_duration = max(task.max_duration, t_end - t_start)
+            with self.cond:
+                self.current = None
+                if isinstance(deadline, float):
+                    task.deadline = deadline
+                elif task.deadline > t_start:
+                    pass  # triggered again while running
+                elif task.period is None:
+                    task.deadline = math.inf
+                else:
+                    task.deadline += task.period
+                    if task.deadline <= t_end:
+                        missed = int((t_end - task.deadline) / task.period) + 1
+                        task.overruns += 1
+                        task.overrun_metric.inc()
+                        task.skipped += missed
+                        task.deadline += missed * task.period
+                self.cond.notify_all()
+
+
+_scheduler = None
+_lock = threading.Lock()
+
+
+def get_scheduler():
+    # Scheduler shared by every manager of the process
+    global _scheduler
+    with _lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
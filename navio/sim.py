@@ -0,0 +1,513 @@
+import os
+import math
+import time
+import errno
+import random
+import numpy as np
+from navio.calibration import crc4
+
+
+# Register-level fakes of the Navio sensors (MPU9250 + AK8963 over SPI, MS5611 and PCA9685 over
+# I2C) and data sources that feed them, either synthetic or replayed from navio.recorder files.
+# Install with navio.bus.set_simulation(Simulation(...)) or NAVIO_SIM=1 before creating drivers.
+
+G_SI = 9.80665
+PI = 3.14159  # same rounding as MPU9250.PI so raw values round-trip exactly
+
+
+class SimClock:
+
+    # Simulated time running `speed` times faster than real time
+    def __init__(self, speed=1.0):
+        self.speed = speed
+        self.t_start = time.monotonic()
+
+    def now(self):
+        return (time.monotonic() - self.t_start) * self.speed
+
+
+# ---- Data sources ---------------------------------------------------------------------------------
+
+class SyntheticIMU:
+
+    # Board lying flat, slowly turning around z, with sensor noise
+    def __init__(self, yaw_rate=0.1, noise=0.02):
+        self.yaw_rate = yaw_rate
+        self.noise = noise
+
+    def sample(self, t):
+        n = self.noise
+        yaw = self.yaw_rate * t
+        acc = (random.gauss(0, n), random.gauss(0, n), G_SI + random.gauss(0, n))
+        gyro = (random.gauss(0, n/10), random.gauss(0, n/10), self.yaw_rate + random.gauss(0, n/10))
+        # Earth field pointing north (+y, ENU as in the attitude filter) and down, seen from the body
+        mag = (20.0*math.sin(yaw) + random.gauss(0, 1), 20.0*math.cos(yaw) + random.gauss(0, 1), -40.0)
+        return acc, gyro, mag, 35.0
+
+
+class SyntheticBaro:
+
+    # Raw MS5611 conversions around the datasheet example (20.07 degC, 1000.09 mbar)
+    def __init__(self, noise=200):
+        self.noise = noise
+
+    def sample(self, t):
+        return 9085466 + int(random.gauss(0, self.noise)), 8569150 + int(random.gauss(0, self.noise/10))
+
+
+class Replay:
+
+    # Replays navio.recorder files in a loop, sample(t) returns the record at t seconds into the log
+    def __init__(self, directory, name):
+        from navio.recorder import Recording
+        recordings = [recording[:] for recording in Recording.find(directory, name) if len(recording)]
+        if not recordings:
+            raise ValueError(f"No {name} recording in {directory}")
+        self.records = np.concatenate(recordings)
+        self.t = self.records["t"] - self.records["t"][0]
+        self.duration = self.t[-1] if self.t[-1] > 0 else 1.0
+
+    def record(self, t):
+        i = np.searchsorted(self.t, t % self.duration, side="right") - 1
+        return self.records[max(i, 0)]
+
+
+class ReplayIMU(Replay):
+
+    def __init__(self, directory):
+        super().__init__(directory, "imu")
+
+    def sample(self, t):
+        r = self.record(t)
+        return r["acc"].tolist(), r["gyro"].tolist(), r["mag"].tolist(), float(r["temp"])
+
+
+class ReplayBaro(Replay):
+
+    def __init__(self, directory):
+        super().__init__(directory, "baro")
+
+    def sample(self, t):
+        r = self.record(t)
+        return int(r["d1"]), int(r["d2"])
+
+
+# ---- SPI: MPU9250 + AK8963 ------------------------------------------------------------------------
+
+class FakeAK8963:
+
+    WIA = 0x00
+    ST1 = 0x02
+    HXL = 0x03
+    ST2 = 0x09
+    CNTL1 = 0x0A
+    CNTL2 = 0x0B
+    ASAX = 0x10
+    SCALE = 0.15  # uT/LSB with ASA = 128
+    RATES = {0x02: 8.0, 0x06: 100.0}  # CNTL1 continuous measurement modes 1 and 2
+
+    def __init__(self):
+        self.regs = bytearray(0x13)
+        self.measurement = None
+        self.reset()
+
+    def reset(self):
+        self.regs[:] = bytes(len(self.regs))
+        self.measurement = None
+        self.regs[self.WIA] = 0x48
+        self.regs[self.ASAX:self.ASAX + 3] = bytes((128, 128, 128))
+
+    def due(self, t):
+        # True when the measurement mode produces a new sample at time t
+        rate = self.RATES.get(self.regs[self.CNTL1] & 0x0F)
+        if rate is None:
+            return False
+        measurement = int(t * rate)
+        if measurement == self.measurement:
+            return False
+        self.measurement = measurement
+        return True
+
+    def set_field(self, mag):
+        overflow = False
+        for i, value in enumerate(mag):
+            raw = int(round(value / self.SCALE))
+            overflow |= abs(raw) > 32760
+            raw = max(-32760, min(32760, raw))
+            self.regs[self.HXL + 2*i:self.HXL + 2*i + 2] = raw.to_bytes(2, "little", signed=True)
+        # DRDY, and DOR when the previous sample was not read
+        self.regs[self.ST1] = 0x03 if self.regs[self.ST1] & 0x01 else 0x01
+        self.regs[self.ST2] = 0x10 | (0x08 if overflow else 0x00)  # 16-bit output, HOFL
+
+    def write(self, reg, value):
+        if reg == self.CNTL2 and value & 0x01:
+            self.reset()
+        elif reg < len(self.regs):
+            self.regs[reg] = value
+
+    def read(self, reg, length):
+        data = bytes(self.regs[reg:reg + length]).ljust(length, b"\0")
+        if reg <= self.ST2 < reg + length:
+            self.regs[self.ST1] = 0x00  # reading ST2 releases the data registers
+        return data
+
+
+class FakeMPU9250:
+
+    # Implements the subset of the register map used by navio.mpu9250: WHO_AM_I, configuration,
+    # sensor output registers, the I2C master slave 0 (AK8963 access through EXT_SENS_DATA, slave delay), the
+    # FIFO with overflow status and the data-ready status bit. Samples are produced at
+    # 1 kHz / (1 + SMPLRT_DIV) of simulated time.
+
+    SMPLRT_DIV = 0x19
+    GYRO_CONFIG = 0x1B
+    ACCEL_CONFIG = 0x1C
+    FIFO_EN = 0x23
+    I2C_SLV0_ADDR = 0x25
+    I2C_SLV0_REG = 0x26
+    I2C_SLV0_CTRL = 0x27
+    I2C_SLV4_CTRL = 0x34
+    INT_ENABLE = 0x38
+    INT_STATUS = 0x3A
+    ACCEL_XOUT_H = 0x3B
+    EXT_SENS_DATA_00 = 0x49
+    I2C_SLV0_DO = 0x63
+    I2C_MST_DELAY_CTRL = 0x67
+    USER_CTRL = 0x6A
+    PWR_MGMT_1 = 0x6B
+    FIFO_COUNTH = 0x72
+    FIFO_R_W = 0x74
+    WHOAMI = 0x75
+
+    FIFO_SIZE = 512
+    ACC_DIVIDERS = {0x00: 16384.0, 0x08: 8192.0, 0x10: 4096.0, 0x18: 2048.0}
+    GYRO_DIVIDERS = {0x00: 131.0, 0x08: 65.6, 0x10: 32.8, 0x18: 16.4}
+
+    def __init__(self, source, clock):
+        self.source = source
+        self.clock = clock
+        self.regs = bytearray(128)
+        self.ak8963 = FakeAK8963()
+        self.fifo = bytearray()
+        self.samples = 0
+        self.transfers = 0
+        self.max_speed_hz = 0
+        self.mode = 0
+        self.reset()
+
+    def reset(self):
+        self.regs[:] = bytes(len(self.regs))
+        self.regs[self.WHOAMI] = 0x71
+        self.fifo.clear()
+        self.t_sample = self.clock.now()
+
+    # spidev.SpiDev interface
+    def open(self, bus_number, dev_number):
+        pass
+
+    def close(self):
+        pass
+
+    def xfer2(self, data, speed_hz=0, delay_usecs=0, bits_per_word=0):
+        self.transfers += 1
+        reg = data[0] & 0x7F
+        if data[0] & 0x80:
+            length = len(data) - 1
+            self.__tick()
+            if reg == self.FIFO_R_W:
+                out = self.fifo[:length]
+                del self.fifo[:length]
+                return [0] + list(out.ljust(length, b"\0"))
+            if reg <= self.FIFO_COUNTH < reg + length:
+                self.regs[self.FIFO_COUNTH:self.FIFO_COUNTH + 2] = len(self.fifo).to_bytes(2, "big")
+            out = [0] + list(self.regs[reg:reg + length])
+            if reg <= self.INT_STATUS < reg + length:
+                self.regs[self.INT_STATUS] = 0x00  # cleared on read
+            return out
+        for i, value in enumerate(data[1:]):
+            self.__write(reg + i, value)
+        return [0] * len(data)
+
+    def writebytes2(self, data):
+        self.xfer2(list(data))
+
+    def __write(self, reg, value):
+        if reg == self.PWR_MGMT_1 and value & 0x80:
+            self.reset()
+            return
+        self.regs[reg] = value
+        if reg == self.USER_CTRL and value & 0x04:
+            self.fifo.clear()
+        elif reg == self.I2C_SLV0_CTRL and value & 0x80:
+            self.__slave0()
+
+    def __slave0(self):
+        address = self.regs[self.I2C_SLV0_ADDR]
+        reg = self.regs[self.I2C_SLV0_REG]
+        length = self.regs[self.I2C_SLV0_CTRL] & 0x0F
+        if address & 0x7F != 0x0C:
+            return
+        if address & 0x80:
+            data = self.ak8963.read(reg, length)
+            self.regs[self.EXT_SENS_DATA_00:self.EXT_SENS_DATA_00 + length] = data
+        else:
+            self.ak8963.write(reg, self.regs[self.I2C_SLV0_DO])
+
+    def sample_period(self):
+        return (1 + self.regs[self.SMPLRT_DIV]) / 1000.0
+
+    def __tick(self):
+        # Produce every sample due since the previous access (bounded by what the FIFO can hold)
+        period = self.sample_period()
+        now = self.clock.now()
+        due = int((now - self.t_sample) / period)
+        if due <= 0:
+            return
+        self.t_sample += due * period
+        max_frames = self.FIFO_SIZE // 14 + 1
+        if due > max_frames:
+            if self.regs[self.USER_CTRL] & 0x40:
+                self.regs[self.INT_STATUS] |= 0x10
+            due = max_frames
+        for i in range(due):
+            self.__sample(self.t_sample - (due - 1 - i) * period)
+
+    def __sample(self, t):
+        acc, gyro, mag, temp = self.source.sample(t)
+        acc_div = self.ACC_DIVIDERS.get(self.regs[self.ACCEL_CONFIG] & 0x18)
+        gyro_div = self.GYRO_DIVIDERS.get(self.regs[self.GYRO_CONFIG] & 0x18)
+        raw = [v / G_SI * acc_div for v in acc] + [(temp - 36.53) * 340.0] + [v * 180 / PI * gyro_div for v in gyro]
+        out = b"".join(max(-32768, min(32767, int(round(v)))).to_bytes(2, "big", signed=True) for v in raw)
+        self.regs[self.ACCEL_XOUT_H:self.ACCEL_XOUT_H + 14] = out
+        if self.ak8963.due(t):
+            self.ak8963.set_field(mag)
+        if self.regs[self.I2C_SLV0_CTRL] & 0x80 and self.regs[self.I2C_SLV0_ADDR] & 0x80:
+            # The I2C master re-reads the slave at every sample, or every 1 + I2C_MST_DLY samples
+            delay = self.regs[self.I2C_SLV4_CTRL] & 0x1F if self.regs[self.I2C_MST_DELAY_CTRL] & 0x01 else 0
+            if self.samples % (1 + delay) == 0:
+                self.__slave0()
+        self.regs[self.INT_STATUS] |= 0x01  # RAW_DATA_RDY
+        self.samples += 1
+        if self.regs[self.USER_CTRL] & 0x40 and self.regs[self.FIFO_EN]:
+            fifo_en = self.regs[self.FIFO_EN]
+            frame = b""
+            if fifo_en & 0x08:
+                frame += out[0:6]
+            if fifo_en & 0x80:
+                frame += out[6:8]
+            if fifo_en & 0x70:
+                frame += out[8:14]
+            if fifo_en & 0x01:
+                frame += bytes(self.regs[self.EXT_SENS_DATA_00:self.EXT_SENS_DATA_00 +
+                                         (self.regs[self.I2C_SLV0_CTRL] & 0x0F)])
+            self.fifo += frame
+            if len(self.fifo) > self.FIFO_SIZE:
+                del self.fifo[:len(self.fifo) - self.FIFO_SIZE]
+                self.regs[self.INT_STATUS] |= 0x10
+
+
+# ---- I2C: MS5611 and PCA9685 ----------------------------------------------------------------------
+
+class FakeMS5611:
+
+    PROM = [0, 40127, 36924, 23317, 23282, 33464, 28312, 0]  # datasheet example coefficients
+    CONVERSION_TIME = {0x00: 0.00060, 0x02: 0.00117, 0x04: 0.00228, 0x06: 0.00454, 0x08: 0.00904}
+
+    def __init__(self, source, clock):
+        self.source = source
+        self.clock = clock
+        self.prom = list(self.PROM)
+        self.prom[7] = crc4(self.prom)
+        self.pending = None
+        self.t_ready = 0.0
+        self.adc = 0
+        self.conversions = 0
+
+    def write_byte(self, cmd):
+        if cmd == 0x1E:
+            self.pending = None
+        elif 0x40 <= cmd <= 0x58:
+            # Conversion results are only available once the OSR dependent delay has elapsed
+            self.pending = "d1" if cmd < 0x50 else "d2"
+            self.t_ready = self.clock.now() + self.CONVERSION_TIME[cmd & 0x0F]
+            self.conversions += 1
+
+    def read_block(self, reg, length):
+        if 0xA0 <= reg <= 0xAE:
+            return list(self.prom[(reg - 0xA0) // 2].to_bytes(2, "big"))[:length]
+        if reg == 0x00:
+            value = 0
+            if self.pending and self.clock.now() >= self.t_ready:
+                d1, d2 = self.source.sample(self.clock.now())
+                value = d1 if self.pending == "d1" else d2
+            self.pending = None
+            return list(value.to_bytes(3, "big"))[:length]
+        return [0] * length
+
+
+class FakePCA9685:
+
+    def __init__(self):
+        self.regs = bytearray(256)
+        self.regs[0x00] = 0x11  # MODE1: SLEEP | ALLCALL after power-up
+        self.regs[0xFE] = 0x1E  # PRE_SCALE: 200 Hz
+        self.writes = 0
+
+    def write(self, reg, data):
+        self.writes += 1
+        auto_increment = self.regs[0x00] & 0x20
+        for i, value in enumerate(data):
+            target = (reg + i) & 0xFF if auto_increment or i == 0 else reg
+            if target == 0xFE and not self.regs[0x00] & 0x10:
+                continue  # PRE_SCALE is only writable in sleep mode
+            if 0xFA <= target <= 0xFD:
+                # ALL_LED registers are written to every channel
+                for base in range(0x06 + target - 0xFA, 0x46, 4):
+                    self.regs[base] = value
+            self.regs[target] = value
+
+    def read(self, reg, length):
+        return list(self.regs[reg:reg + length])
+
+    def get_pwm(self, channel):
+        base = 0x06 + 4 * channel
+        on = self.regs[base] | (self.regs[base + 1] & 0x1F) << 8
+        off = self.regs[base + 2] | (self.regs[base + 3] & 0x1F) << 8
+        return on, off
+
+    def get_frequency(self):
+        return 25000000.0 / (4096 * (self.regs[0xFE] + 1))
+
+
+class FakeSMBus:
+
+    # smbus.SMBus interface, dispatching by address to the simulated devices on the bus
+    def __init__(self, devices):
+        self.devices = devices
+        self.transactions = 0
+
+    def __device(self, address):
+        self.transactions += 1
+        try:
+            return self.devices[address]
+        except KeyError:
+            raise OSError(errno.EREMOTEIO, f"No device at address 0x{address:02x}")
+
+    def write_byte(self, address, value):
+        device = self.__device(address)
+        if isinstance(device, FakeMS5611):
+            device.write_byte(value)
+        else:
+            device.write(value, b"")
+
+    def write_byte_data(self, address, reg, value):
+        self.__device(address).write(reg, [value])
+
+    def write_i2c_block_data(self, address, reg, data):
+        if len(data) > 32:
+            raise OSError(errno.EINVAL, "SMBus block writes are limited to 32 bytes")
+        self.__device(address).write(reg, data)
+
+    def read_byte_data(self, address, reg):
+        device = self.__device(address)
+        if isinstance(device, FakeMS5611):
+            return device.read_block(reg, 1)[0]
+        return device.read(reg, 1)[0]
+
+    def read_i2c_block_data(self, address, reg, length):
+        device = self.__device(address)
+        if isinstance(device, FakeMS5611):
+            return device.read_block(reg, length)
+        return device.read(reg, length)
+
+    def close(self):
+        pass
+
+
+class FakePin:
+
+    # gpiozero.LED interface
+    def __init__(self, pin):
+        self.pin = pin
+        self.value = 0
+
+    def on(self):
+        self.value = 1
+
+    def off(self):
+        self.value = 0
+
+    def close(self):
+        pass
+
+
+class FakeInterruptPin:
+
+    # navio.bus.EdgeInput interface wired to the MPU9250 INT output: with the data ready
+    # interrupt enabled, an edge occurs at every sample of the simulated sensor clock
+    def __init__(self, pin, mpu9250, clock):
+        self.pin = pin
+        self.mpu9250 = mpu9250
+        self.clock = clock
+        self.t_edge = None  # simulated time of the last edge returned
+
+    def wait_edge(self, timeout=None):
+        # Returns (time.time() of the latest edge, edges since the previous call), or None on timeout
+        mpu = self.mpu9250
+        if not mpu.regs[mpu.INT_ENABLE] & 0x01:
+            time.sleep(timeout or 0.0)
+            return None
+        period = mpu.sample_period()
+        now = self.clock.now()
+        if self.t_edge is None or self.t_edge < now - 1.0:
+            self.t_edge = now  # edges before the first wait are not reported
+        k_last = math.floor((self.t_edge - mpu.t_sample) / period + 1e-9)
+        k_next = k_last + 1
+        t_next = mpu.t_sample + k_next * period
+        wait = (t_next - now) / self.clock.speed
+        if timeout is not None and wait > timeout:
+            time.sleep(timeout)
+            return None
+        if wait > 0:
+            time.sleep(wait + 0.00005)  # past the edge, with the sample in the output registers
+        now = self.clock.now()
+        k_latest = max(k_next, math.floor((now - mpu.t_sample) / period + 1e-9))
+        self.t_edge = mpu.t_sample + k_latest * period
+        return time.time() - (now - self.t_edge) / self.clock.speed, k_latest - k_last
+
+    def close(self):
+        pass
+
+
+class Simulation:
+
+    # One simulated Navio board: devices are shared between every driver that opens them
+    def __init__(self, imu_source=None, baro_source=None, speed=1.0):
+        self.clock = SimClock(speed)
+        self.mpu9250 = FakeMPU9250(imu_source or SyntheticIMU(), self.clock)
+        self.ms5611 = FakeMS5611(baro_source or SyntheticBaro(), self.clock)
+        self.pca9685 = FakePCA9685()
+        self.i2c = FakeSMBus({0x77: self.ms5611, 0x40: self.pca9685})
+        self.pins = {}
+
+    @classmethod
+    def from_env(cls):
+        # NAVIO_SIM_REPLAY=<recordings directory>, NAVIO_SIM_SPEED=<replay speed factor>
+        directory = os.environ.get("NAVIO_SIM_REPLAY")
+        speed = float(os.environ.get("NAVIO_SIM_SPEED", 1.0))
+        if directory:
+            return cls(ReplayIMU(directory), ReplayBaro(directory), speed)
+        return cls(speed=speed)
+
+    def open_spi(self, bus_number, dev_number):
+        return self.mpu9250
+
+    def open_i2c(self, bus_number):
+        return self.i2c
+
+    def output_pin(self, pin):
+        return self.pins.setdefault(pin, FakePin(pin))
+
+    def input_pin(self, pin):
+        # The only interrupt source of the simulated board is the MPU9250 INT output
+        return self.pins.setdefault(pin, FakeInterruptPin(pin, self.mpu9250, self.clock))
@@ -0,0 +1,71 @@
+import time
+import threading
+
+
+class StartupManager:
+
+    # Runs the initialization of every sensor in its own background thread so the web server can
+    # serve requests right away. Each task goes through "pending" -> "initializing" -> "ready"
+    # (or "error"), and the time it became ready is measured from `t_start`, which should be taken
+    # as early as possible in the process to report the real cold-start time.
+
+    def __init__(self, t_start=None):
+        self.t_start = time.monotonic() if t_start is None else t_start
+        self.t_server = None
+        self.tasks = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, init):
+        # init() runs in the background thread and may import, open buses and block on the sensors
+        self.tasks[name] = {"init": init, "state": "pending", "error": None, "ready_after": None,
+                            "init_time": None, "ready": threading.Event(), "thread": None}
+
+    def __run(self, name):
+        task = self.tasks[name]
+        with self.lock:
+            task["state"] = "initializing"
+        t = time.monotonic()
+        try:
+            task["init"]()
+        except Exception as e:
+            with self.lock:
+                task["state"] = "error"
+                task["error"] = f"{type(e).__name__}: {e}"
+            print(f"Error: {name} initialization failed ({task['error']})")
+            return
+        with self.lock:
+            task["state"] = "ready"
+            task["init_time"] = time.monotonic() - t
+            task["ready_after"] = time.monotonic() - self.t_start
+        task["ready"].set()
+        print(f"{name} ready after {task['ready_after']:.3f} s (init {task['init_time']:.3f} s)")
+
+    def start(self):
+        for name, task in self.tasks.items():
+            if task["thread"] is None:
+                task["thread"] = threading.Thread(target=self.__run, args=(name,), daemon=True)
+                task["thread"].start()
+
+    def server_started(self):
+        self.t_server = time.monotonic() - self.t_start
+        print(f"Server started after {self.t_server:.3f} s")
+
+    def is_ready(self, name):
+        return name in self.tasks and self.tasks[name]["ready"].is_set()
+
+    def wait(self, name, timeout=None):
+        if name not in self.tasks:
+            return False
+        return self.tasks[name]["ready"].wait(timeout)
+
+    def status(self):
+        with self.lock:
+            sensors = {name: {"state": task["state"], "error": task["error"], "ready_after": task["ready_after"],
+                              "init_time": task["init_time"]} for name, task in self.tasks.items()}
+        ready_after = [sensor["ready_after"] for sensor in sensors.values()]
+        return {
+            "uptime": time.monotonic() - self.t_start,
+            "server_started_after": self.t_server,
+            "all_ready_after": max(ready_after) if ready_after and None not in ready_after else None,
+            "sensors": sensors,
+        }
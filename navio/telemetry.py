@@ -0,0 +1,37 @@
+import json
+import base64
+import struct
+import numpy as np
+
+
+class BinaryEncoder:
+
+    # Packs a block of samples into one base64 SSE message of little-endian float32 rows.
+    # Message layout:
+    #   header  <HHHxxd  version, fields per row, rows, padding, t0 (float64 epoch seconds)
+    #   rows    float32[rows][fields], first field is the time offset from t0 in seconds
+    # Field names are sent once per connection in a "schema" event (see schema()).
+
+    VERSION = 1
+    HEADER = struct.Struct("<HHHxxd")
+
+    def __init__(self, fields, columns):
+        # fields: names of the transmitted signals, columns: their column index in the sample blocks
+        self.fields = ("t",) + tuple(fields)
+        self.columns = list(columns)
+        self.out = np.zeros((0, len(self.fields)), dtype="<f4")
+
+    def schema(self):
+        return f"event: schema\ndata: {json.dumps({'version': self.VERSION, 'fields': self.fields})}\n\n".encode()
+
+    def encode(self, block):
+        # block: N x M float64 samples with the timestamp in column 0
+        n = len(block)
+        if n > len(self.out):
+            self.out = np.zeros((n, len(self.fields)), dtype="<f4")
+        t0 = float(block[0, 0]) if n else 0.0
+        out = self.out[:n]
+        np.subtract(block[:, 0], t0, out=out[:, 0], casting="unsafe")
+        out[:, 1:] = block[:, self.columns]
+        payload = self.HEADER.pack(self.VERSION, len(self.fields), n, t0) + out.tobytes()
+        return b"data: " + base64.b64encode(payload) + b"\n\n"
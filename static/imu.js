@@ -20,35 +20,32 @@ class IMUDisp {
             cell.appendChild(cellValue);
             document.getElementById("imu-matrix").appendChild(cell);
         });
-        this.eventSource = null;
+        this.valueElements = this.signalsList.map((signal) => document.getElementById(`val-${signal}`));
+        this.stream = null;
         this.start = this.start.bind(this);
         this.stop = this.stop.bind(this);
     }
 
     start() {
         this.isRunning = true;
-        this.eventSource = new EventSource('/events-imu');
-        this.eventSource.onmessage = (event) => {
-            try {
-                const values = JSON.parse(event.data);
-                this.signalsList.forEach((signal, signalIndex) => {
-                    document.getElementById(`val-${signal}`).innerHTML = values[signal].toFixed(3)
-                });
-            } catch (e) {
-                console.error('Erreur lors de l\'analyse des données JSON:', e);
-            }
-        };
-        this.eventSource.onerror = (error) => {
-            console.error('Erreur EventSource:', error);
-            this.stop();
-        };
+        this.stream = new TelemetryStream('/events-imu-bin', (stream, rows, nRows, t0) => {
+            // Only the most recent sample of the batch is displayed
+            const last = (nRows - 1)*stream.fields.length;
+            this.signalsList.forEach((signal, signalIndex) => {
+                const fieldIndex = stream.indexOf(signal);
+                if (nRows > 0 && fieldIndex >= 0) {
+                    this.valueElements[signalIndex].innerHTML = rows[last + fieldIndex].toFixed(3);
+                }
+            });
+        }, this.stop);
+        this.stream.open();
     }
 
     stop() {
         this.isRunning = false;
-        if (this.eventSource) {
-            this.eventSource.close();
-            this.eventSource = null;
+        if (this.stream) {
+            this.stream.close();
+            this.stream = null;
         }
     }
 }
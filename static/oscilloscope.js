@@ -6,26 +6,46 @@ class OscilloscopeSignal {
         this.yMin = yMin;
         this.yMax = yMax;
         this.maxBufferSize = maxBufferSize;
-        this.tBuffer = [];
-        this.valBuffer = [];
+        // Preallocated ring buffers: sample i (0 = oldest) is stored at index (head + i) % maxBufferSize
+        this.tBuffer = new Float64Array(maxBufferSize);
+        this.valBuffer = new Float64Array(maxBufferSize);
+        this.head = 0;
+        this.length = 0;
     }
 
     bufferLength() {
-        return this.tBuffer.length;
+        return this.length;
+    }
+
+    bufferIndex(i) {
+        const j = this.head + i;
+        return j < this.maxBufferSize ? j : j - this.maxBufferSize;
+    }
+
+    getT(i) {
+        return this.tBuffer[this.bufferIndex(i)];
+    }
+
+    getVal(i) {
+        return this.valBuffer[this.bufferIndex(i)];
     }
 
     pushVal(t, val) {
-        this.tBuffer.push(t);
-        this.valBuffer.push(val);
-        if (this.tBuffer.length > this.maxBufferSize) {
-            this.tBuffer.shift();
-            this.valBuffer.shift();
+        const j = this.bufferIndex(this.length % this.maxBufferSize);
+        this.tBuffer[j] = t;
+        this.valBuffer[j] = val;
+        if (this.length < this.maxBufferSize) {
+            this.length++;
+        } else {
+            this.head = this.bufferIndex(1);
         }
     }
 
     shiftVal() {
-        this.tBuffer.shift();
-        this.valBuffer.shift();
+        if (this.length > 0) {
+            this.head = this.bufferIndex(1);
+            this.length--;
+        }
     }
 }
 
@@ -69,15 +89,20 @@ class OscilloscopeChannel {
     }
 
     getYPosition(valueIndex) {
-        return this.canvasElmt.height*(1 - (this.signal.valBuffer[valueIndex]-this.chMin)/(this.chMax-this.chMin));
+        return this.yPosition(this.signal.getVal(valueIndex));
+    }
+
+    yPosition(value) {
+        return this.canvasElmt.height*(1 - (value-this.chMin)/(this.chMax-this.chMin));
     }
 
 }
 
 class Oscilloscope {
 
-    constructor(scopeId, title, signals, timeSpan=20) {
+    constructor(scopeId, title, signals, timeSpan=20, source='/events-baro-bin') {
         this.scopeId = scopeId;
+        this.source = source;
         this.oscilloscopeElement = document.getElementById(scopeId);
         this.oscilloscopeElement.innerHTML = 
             `<div id="${scopeId}-header" class="scope-header">
@@ -160,7 +185,8 @@ class Oscilloscope {
 
         this.isRunning = false;
         this.animationFrameId = null;
-        this.eventSource = null;
+        this.stream = null;
+        this.allocateColumns(this.canvas.width);
         this.animate = this.animate.bind(this);
         this.startOscilloscope = this.startOscilloscope.bind(this);
         this.stopOscilloscope = this.stopOscilloscope.bind(this);
@@ -168,18 +194,72 @@ class Oscilloscope {
         document.getElementById(`${scopeId}-play`).addEventListener('click', this.launchOscilloscope);
     }
 
+    allocateColumns(width) {
+        this.colWidth = width;
+        this.colX = new Int32Array(width + 1);
+        this.colFirst = new Float64Array(width + 1);
+        this.colLast = new Float64Array(width + 1);
+        this.colMin = new Float64Array(width + 1);
+        this.colMax = new Float64Array(width + 1);
+    }
+
+    decimate(signal, scaleX) {
+        // Min/max per pixel column, returns the number of columns holding samples
+        const width = this.colWidth;
+        const tBuffer = signal.tBuffer;
+        const valBuffer = signal.valBuffer;
+        const t0 = signal.getT(0);
+        let j = signal.head;
+        let nCols = 0;
+        let lastCol = -1;
+        for (let i = 0; i < signal.bufferLength(); i++) {
+            const col = Math.min(width, Math.max(0, Math.floor((tBuffer[j] - t0)*scaleX)));
+            const val = valBuffer[j];
+            if (col !== lastCol) {
+                this.colX[nCols] = col;
+                this.colFirst[nCols] = val;
+                this.colLast[nCols] = val;
+                this.colMin[nCols] = val;
+                this.colMax[nCols] = val;
+                lastCol = col;
+                nCols++;
+            } else {
+                const k = nCols - 1;
+                this.colLast[k] = val;
+                if (val < this.colMin[k]) {
+                    this.colMin[k] = val;
+                } else if (val > this.colMax[k]) {
+                    this.colMax[k] = val;
+                }
+            }
+            j = (j + 1 < signal.maxBufferSize) ? j + 1 : 0;
+        }
+        return nCols;
+    }
+
     drawGraph() {
         this.ctx.clearRect(0, 0, this.canvas.width, this.canvas.height);
         this.ctx.lineWidth = 1;
+        if (this.colWidth !== this.canvas.width) {
+            this.allocateColumns(this.canvas.width);
+        }
         const scaleX = this.canvas.width/this.timeSpan;
         this.signals.forEach((signal, signalIndex) => {
             if (signal.bufferLength() > 1) {
+                // Stroke cost depends on the canvas width, not on the number of buffered samples
+                const channel = this.channels[signalIndex];
+                const nCols = this.decimate(signal, scaleX);
                 this.ctx.beginPath();
                 this.ctx.strokeStyle = this.channelColors[signalIndex];
-                this.ctx.moveTo(0, this.channels[signalIndex].getYPosition(0));
-                for (let i = 1; i < signal.bufferLength(); i++) {
-                    this.ctx.lineTo((signal.tBuffer[i] - signal.tBuffer[0])*scaleX,
-                                    this.channels[signalIndex].getYPosition(i));
+                this.ctx.moveTo(this.colX[0], channel.yPosition(this.colFirst[0]));
+                for (let k = 0; k < nCols; k++) {
+                    const x = this.colX[k];
+                    this.ctx.lineTo(x, channel.yPosition(this.colFirst[k]));
+                    if (this.colMin[k] !== this.colMax[k]) {
+                        this.ctx.lineTo(x, channel.yPosition(this.colMin[k]));
+                        this.ctx.lineTo(x, channel.yPosition(this.colMax[k]));
+                    }
+                    this.ctx.lineTo(x, channel.yPosition(this.colLast[k]));
                 }
                 this.ctx.stroke();
             }
@@ -195,28 +275,26 @@ class Oscilloscope {
 
     startOscilloscope() {
         this.isRunning = true;
-        this.eventSource = new EventSource('/events-baro');
-        this.eventSource.onmessage = (event) => {
-            try {
-                const values = JSON.parse(event.data);
-                this.signals.forEach((signal, signalIndex) => {
-                    signal.pushVal(values.time, values[signal.name])
-                    while (signal.bufferLength() > 1) {
-                        if (signal.tBuffer[signal.bufferLength()-2] - signal.tBuffer[0] > this.timeSpan) {
-                            signal.shiftVal();
-                        } else {
-                            break;
-                        }
+        this.stream = new TelemetryStream(this.source, (stream, rows, nRows, t0) => {
+            const nFields = stream.fields.length;
+            this.signals.forEach((signal, signalIndex) => {
+                const fieldIndex = stream.indexOf(signal.name);
+                if (fieldIndex < 0) {
+                    return;
+                }
+                for (let r = 0; r < nRows; r++) {
+                    signal.pushVal(t0 + rows[r*nFields], rows[r*nFields + fieldIndex]);
+                }
+                while (signal.bufferLength() > 1) {
+                    if (signal.getT(signal.bufferLength()-2) - signal.getT(0) > this.timeSpan) {
+                        signal.shiftVal();
+                    } else {
+                        break;
                     }
-                });
-            } catch (e) {
-                console.error('Erreur lors de l\'analyse des données JSON:', e);
-            }
-        };
-        this.eventSource.onerror = (error) => {
-            console.error('Erreur EventSource:', error);
-            this.stopOscilloscope();
-        };
+                }
+            });
+        }, this.stopOscilloscope);
+        this.stream.open();
         this.animate();
     }
 
@@ -225,9 +303,9 @@ class Oscilloscope {
         if (this.animationFrameId) {
             cancelAnimationFrame(this.animationFrameId);
         }
-        if (this.eventSource) {
-            this.eventSource.close();
-            this.eventSource = null;
+        if (this.stream) {
+            this.stream.close();
+            this.stream = null;
         }
     }
 
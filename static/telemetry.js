@@ -0,0 +1,62 @@
+class TelemetryStream {
+
+    // Binary telemetry over SSE: a "schema" event gives the field names, then every message is a
+    // base64 frame made of a 16-byte header (version, fields, rows, t0) and float32 rows.
+    // onSamples(stream, rows, nRows, t0) is called with a Float32Array view of the rows, the first
+    // field of each row being the time offset from t0 in seconds.
+
+    constructor(url, onSamples, onError=null) {
+        this.url = url;
+        this.onSamples = onSamples;
+        this.onError = onError;
+        this.fields = [];
+        this.fieldIndex = {};
+        this.eventSource = null;
+    }
+
+    indexOf(name) {
+        return (name in this.fieldIndex) ? this.fieldIndex[name] : -1;
+    }
+
+    open() {
+        this.eventSource = new EventSource(this.url);
+        this.eventSource.addEventListener('schema', (event) => {
+            const schema = JSON.parse(event.data);
+            this.fields = schema.fields;
+            this.fieldIndex = {};
+            this.fields.forEach((field, fieldIndex) => {
+                this.fieldIndex[field] = fieldIndex;
+            });
+        });
+        this.eventSource.onmessage = (event) => {
+            try {
+                const binary = atob(event.data);
+                const bytes = new Uint8Array(binary.length);
+                for (let i = 0; i < binary.length; i++) {
+                    bytes[i] = binary.charCodeAt(i);
+                }
+                const header = new DataView(bytes.buffer, 0, 16);
+                const nFields = header.getUint16(2, true);
+                const nRows = header.getUint16(4, true);
+                const t0 = header.getFloat64(8, true);
+                const rows = new Float32Array(bytes.buffer, 16, nRows*nFields);
+                this.onSamples(this, rows, nRows, t0);
+            } catch (e) {
+                console.error('Erreur lors du décodage des données binaires:', e);
+            }
+        };
+        this.eventSource.onerror = (error) => {
+            console.error('Erreur EventSource:', error);
+            if (this.onError) {
+                this.onError(error);
+            }
+        };
+    }
+
+    close() {
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
+        }
+    }
+}
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from navio.fusion import AttitudeFilter
+
+ahrs_filters = pytest.importorskip("ahrs.filters")
+ahrs_orientation = pytest.importorskip("ahrs.common.orientation")
+
+FREQUENCY = 500.0
+TOLERANCE = 1e-6  # degrees
+
+
+def synthetic_motion(samples):
+    # Slow rotation on all axes with noisy gravity and a tilted magnetic field
+    rng = np.random.default_rng(0)
+    t = np.arange(samples) / FREQUENCY
+    gyr = np.column_stack([0.3*np.sin(t), 0.2*np.cos(0.7*t), 0.1*np.ones(samples)]) + rng.normal(0, 0.01, (samples, 3))
+    acc = np.array([0.0, 0.0, 9.81]) + rng.normal(0, 0.2, (samples, 3))
+    mag = np.array([20.0, 2.0, -40.0]) + rng.normal(0, 1.0, (samples, 3))
+    return gyr, acc, mag
+
+
+def reference_rpy(reference, gyr, acc, mag):
+    q = np.array([1.0, 0.0, 0.0, 0.0])
+    rpy = np.zeros((len(gyr), 3))
+    for i in range(len(gyr)):
+        q = reference.updateMARG(q, gyr[i], acc[i], mag[i])
+        rpy[i] = ahrs_orientation.q2rpy(q, in_deg=True)
+    return rpy
+
+
+@pytest.mark.parametrize("algorithm, reference", [
+    (AttitudeFilter.MAHONY, lambda: ahrs_filters.Mahony(frequency=FREQUENCY)),
+    (AttitudeFilter.MADGWICK, lambda: ahrs_filters.Madgwick(frequency=FREQUENCY, gain=0.041)),
+])
+def test_update_block_matches_ahrs(algorithm, reference):
+    gyr, acc, mag = synthetic_motion(2000)
+    expected = reference_rpy(reference(), gyr, acc, mag)
+    _, rpy = AttitudeFilter(algorithm, frequency=FREQUENCY, gain=0.041).update_block(gyr, acc, mag)
+    np.testing.assert_allclose(rpy, expected, rtol=0, atol=TOLERANCE)
+
+
+@pytest.mark.parametrize("algorithm", [AttitudeFilter.MAHONY, AttitudeFilter.MADGWICK])
+def test_update_matches_update_block(algorithm):
+    gyr, acc, mag = synthetic_motion(200)
+    _, expected = AttitudeFilter(algorithm, frequency=FREQUENCY).update_block(gyr, acc, mag)
+    engine = AttitudeFilter(algorithm, frequency=FREQUENCY)
+    rpy = np.zeros((len(gyr), 3))
+    for i in range(len(gyr)):
+        engine.update(gyr[i], acc[i], mag[i])
+        rpy[i] = engine.get_rpy()
+    np.testing.assert_allclose(rpy, expected, rtol=0, atol=TOLERANCE)
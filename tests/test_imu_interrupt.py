@@ -0,0 +1,70 @@
+import time
+import numpy as np
+import pytest
+import navio.bus as navio_bus
+from navio.imu import IMUManager
+from navio.sim import FakeInterruptPin
+
+INT_PIN = 24
+PERIOD = 0.05  # IMUManager reads at 20 Hz in interrupt mode
+
+
+@pytest.fixture
+def simulation(monkeypatch):
+    monkeypatch.setenv("NAVIO_SIM", "1")
+    navio_bus.set_simulation(None)
+    yield navio_bus.get_simulation()
+    navio_bus.set_simulation(None)
+
+
+@pytest.fixture
+def imu(simulation):
+    manager = IMUManager(interrupt_pin=INT_PIN)
+    yield manager
+    manager.shutdown()
+
+
+def run_for(manager, duration):
+    manager.start()
+    time.sleep(duration)
+    manager.shutdown()
+    return manager.window(manager.samples.capacity, copy=True)[:, 0]
+
+
+def test_interrupt_pin_is_simulated(simulation, imu):
+    assert isinstance(imu.pin, FakeInterruptPin)
+    assert imu.imu.sample_period == pytest.approx(PERIOD)
+
+
+def test_samples_follow_the_sensor_clock(simulation, imu):
+    t_start = time.time()
+    t = run_for(imu, 0.6)
+    assert len(t) >= 10
+    assert imu.stats()["interrupts"] == len(t)
+    assert imu.missed == 0 and imu.errors == 0
+    # Timestamped at the interrupt: one sensor period apart, not when the read happened
+    np.testing.assert_allclose(np.diff(t), PERIOD, atol=1e-3)
+    assert t_start < t[0] < t[-1] <= time.time()
+    # On the simulated sensor clock: every timestamp is a whole number of periods after the first
+    k = (t - t[0]) / PERIOD
+    np.testing.assert_allclose(k, np.round(k), atol=0.02)
+
+
+def test_skipped_edge_is_counted(simulation, imu):
+    read = imu.imu.getMotion9
+    calls = []
+
+    def stalled_read():
+        # The fourth read stalls past the next data ready edge
+        calls.append(None)
+        if len(calls) == 4:
+            time.sleep(2.5 * PERIOD)
+        return read()
+
+    imu.imu.getMotion9 = stalled_read
+    t = run_for(imu, 0.6)
+    gaps = np.round(np.diff(t) / PERIOD).astype(int)
+    assert imu.missed == 1
+    assert imu.stats()["missed"] == 1
+    assert list(gaps).count(2) == 1 and gaps[3] == 2
+    assert set(gaps) == {1, 2}